@@ -16,25 +16,82 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import yomi_base.reader_util
-import sys, pysrt, pickle, os, ass
+import sys, pickle, os, collections
+from yomi_base import startup # before the Qt imports, so the startup trace times them
 from PySide import QtCore
 from PySide.QtGui import *
 from yomi_base.settings import cSettings
+from yomi_base.core import cues, rendering
+from yomi_base.core.defstore import DefsStore
+from yomi_base.core.timeline import Timeline
+from yomi_base import constants, instrument, profiling
 from yomi_base.minireader import MiniReader
+from yomi_base.tokenizer import TranscriptTokenizer
 from PySide.phonon import Phonon
 
+class cSpanDelegate(QStyledItemDelegate):
+    # underlines the words found when the transcript was tokenized
+    def __init__(self, subsList):
+        super(cSpanDelegate, self).__init__(subsList)
+        self.subsList = subsList
+
+    def paint(self, painter, option, index):
+        super(cSpanDelegate, self).paint(painter, option, index)
+
+        spans = self.subsList.lineSpans(index.row())
+        if not spans:
+            return
+
+        font = index.data(QtCore.Qt.FontRole) or option.font
+        metrics = QFontMetrics(font)
+        lines = index.data().split('\n')
+        left = option.rect.left() + self.subsList.style().pixelMetric(QStyle.PM_FocusFrameHMargin) + 1
+        top = option.rect.top() + (option.rect.height() - metrics.lineSpacing() * len(lines)) / 2 + metrics.ascent() + 2
+
+        foreground = index.data(QtCore.Qt.ForegroundRole)
+        painter.save()
+        painter.setPen(foreground.color() if foreground else option.palette.color(QPalette.Text))
+
+        lineStart = 0
+        for n, line in enumerate(lines):
+            y = top + n * metrics.lineSpacing()
+            for start, length, id in spans:
+                start -= lineStart
+                if 0 <= start < len(line):
+                    x = left + metrics.width(line[:start])
+                    width = metrics.width(line[start:start + length])
+                    painter.drawLine(x, y, x + width - 2, y)
+            lineStart += len(line) + 1
+
+        painter.restore()
+
 class cSubsList(QListWidget):
     def __init__(self, settings):
         super(cSubsList, self).__init__()
         self.ext = ""
         self.bgColor = "white" #QColor('white')
+        self.itemStyle = None
+        self.timeline = Timeline()
+
+        # set up by the main window
+        self.player = None
+        self.lookupLine = None
+        self.lineDefs = None
+
+        # word spans per line, filled in by a background tokenizer after loading
+        self.spans = None
+        self.tokenizer = None
+        self.setItemDelegate(cSpanDelegate(self))
 
     def settingsupdate(self, ft, fs, cfg, cbg):
         # palette = self.palette()
         # palette.setColor(QPalette.Base, QColor(cbg))
         # palette.setColor(QPalette.Text, QColor(cfg))
         # self.setPalette(palette)
+        if self.itemStyle == (ft, fs, cfg, cbg):
+            return # restyling every item is the slow part, skip it when nothing changed
+
+        self.itemStyle = ft, fs, cfg, cbg
         self.bgColor = cbg
 
         font = QFont()
@@ -42,128 +99,104 @@ class cSubsList(QListWidget):
         font.setFamily(ft)
         #self.setFont(font)
 
+        fg = QColor(cfg)
+        bg = QColor(cbg)
+        self.setUpdatesEnabled(False)
         for i in xrange(self.count()):
             self.item(i).setFont(font)
-            self.item(i).setForeground(QColor(cfg))
-            self.item(i).setBackground(QColor(cbg))
+            self.item(i).setForeground(fg)
+            self.item(i).setBackground(bg)
+        self.setUpdatesEnabled(True)
 
 
     def keyPressEvent(self, event):
         if event.key() == QtCore.Qt.Key_Space:
-            if qp.player.state() == Phonon.PausedState:
-                qp.player.play()
+            if self.player.state() == Phonon.PausedState:
+                self.player.play()
             else:
-                qp.player.pause()
+                self.player.pause()
 
         if event.key() == QtCore.Qt.Key_Right:
-            time = qp.player.currentTime()
+            time = self.player.currentTime()
             time += 5000
-            qp.player.seek(time)
+            self.player.seek(time)
 
         if event.key() == QtCore.Qt.Key_Left:
-            time = qp.player.currentTime()
+            time = self.player.currentTime()
             time -= 5000
-            qp.player.seek(time)
-
-    def loadSubsSrt(self, file):
-        self.subs = pysrt.open(file, encoding='utf-8')
+            self.player.seek(time)
 
-        self.clear()
-        g = 0
-        for i in self.subs:
-            self.insertItem(g, i.text)
-            g = g + 1
+    def loadSubs(self, file):
+        _, fileExtension = os.path.splitext(file)
+        if fileExtension not in (".srt", ".ass"):
+            return
 
-        for i in xrange(self.count()):
-            self.item(i).setFont(QFont('Meiryo', 16))  # MS Mincho
-
-        # back up 1:33
-        # self.subs.shift(seconds=-30) # Move all subs 2 seconds earlier
-        #self.subs.shift(minutes=-1)  # Move all subs 1 minutes later
-        #self.subs.shift(milliseconds=-500 )
-
-        i = self.subs[0]
-        self.currentSubStart = i.start.ordinal
-        self.currentSubEnd = i.end.ordinal
-        self.currentRow = 0
-        i = self.subs[1]
-        self.nextSubStart = i.start.ordinal
-        self.nextSubEnd = i.end.ordinal
-
-    def gotoLineSrt(self):
-        self.item(self.currentRow).setBackground(QColor(self.bgColor))#QColor('white'))
-
-        g = self.currentIndex()
-        self.currentRow = g.row()
-        i = self.subs[g.row()]
-        self.currentSubStart = i.start.ordinal
-        self.currentSubEnd = i.end.ordinal
-        qp.player.seek(self.currentSubStart)
-        i = self.subs[g.row() + 1]
-        self.nextSubStart = i.start.ordinal
-        self.nextSubEnd = i.end.ordinal
-
-        lookupLine.setPlainText(self.subs[g.row()].text)
-        LineDefs.lookup(self.currentRow)
-
-
-    def loadSubsAss(self, file):
-        with open(file, "r") as f:
-             self.subs = ass.parse(f).events
+        self.itemStyle = None # new items, theme has to be applied again
+        self.ext = fileExtension
+        self.timeline.load(cues.loadCues(file))
 
         self.clear()
-        g = 0
-        # for i in self.subs:
-        #     if i.style not in "ED,OP,staff": #*Default": #
-        #         self.insertItem(g, i.text.decode('utf_8'))
-        #         g = g + 1
-        for i in self.subs:
-            self.insertItem(g, i.text.decode('utf_8'))
-            g = g + 1
-
-        for i in xrange(self.count()):
-            self.item(i).setFont(QFont('Meiryo', 16))  # MS Mincho
+        font = QFont('Meiryo', 16) # MS Mincho
+        for row in xrange(len(self.timeline)):
+            self.insertItem(row, self.timeline.text(row))
+            self.item(row).setFont(font)
+
+        self.tokenize()
+
+    def tokenize(self):
+        if self.tokenizer is not None:
+            self.tokenizer.cancelled = True
+            self.tokenizer.wait()
+
+        self.spans = None
+        self.tokenizer = TranscriptTokenizer([self.item(i).text() for i in xrange(self.count())])
+        self.tokenizer.tokenized.connect(self.onTokenized)
+        self.tokenizer.start(QtCore.QThread.LowPriority)
+
+    @profiling.handler
+    def onTokenized(self, lines, spans):
+        if self.tokenizer is None or lines is not self.tokenizer.lines:
+            return # finished just before a newer transcript was loaded
+
+        self.spans = spans
+        self.viewport().update()
+        if self.lookupLine.lookup.spans is None:
+            self.lookupLine.setSpans(self.lineSpans(self.timeline.row))
+
+    def lineSpans(self, row):
+        if self.spans is not None and 0 <= row < len(self.spans):
+            return self.spans[row]
+
+    @profiling.handler
+    def gotoLine(self):
+        self.item(self.timeline.row).setBackground(QColor(self.bgColor))
 
-        i = self.subs[0]
-        self.currentSubStart = i.start.total_seconds() * 1000# + i.start.microseconds
-        self.currentSubEnd = i.end.total_seconds() * 1000# + i.end.microseconds
-        self.currentRow = 0
-        i = self.subs[1]
-        self.nextSubStart = i.start.total_seconds() * 1000# + i.start.microseconds
-        self.nextSubEnd = i.end.total_seconds() * 1000# + i.end.microseconds
+        row = self.currentIndex().row()
+        self.player.seek(self.timeline.seek(row))
 
-    def gotoLineAss(self):
-        self.item(self.currentRow).setBackground(self.bgColor)#QColor('white'))
+        self.lookupLine.setPlainText(self.timeline.text(row))
+        self.lookupLine.setSpans(self.lineSpans(row))
+        self.lineDefs.lookup(row)
 
-        g = self.currentIndex()
-        self.currentRow = g.row()
-        i = self.subs[g.row()]
-        self.currentSubStart = i.start.total_seconds() * 1000# + i.start.microseconds
-        self.currentSubEnd = i.end.total_seconds() * 1000# + i.end.microseconds
-        qp.player.seek(self.currentSubStart)
-        i = self.subs[g.row() + 1]
-        self.nextSubStart = i.start.total_seconds() * 1000# + i.start.microseconds
-        self.nextSubEnd = i.end.total_seconds() * 1000# + i.end.microseconds
+    @profiling.handler
+    def follow(self, time):  # transcript list hi-lite following
+        timeline = self.timeline
+        if len(timeline) == 0:
+            return
 
-        lookupLine.setPlainText(self.subs[g.row()].text.decode('utf_8'))
+        if timeline.ended(time):
+            self.item(timeline.row).setBackground(QColor('grey'))
 
-        LineDefs.lookup(self.currentRow)
+        previous = timeline.row
+        if timeline.tick(time):
+            self.item(previous).setBackground(QColor('white'))
+            self.item(timeline.row).setBackground(QColor('red'))
 
-    def loadSubs(self, file):
-        _, fileExtension = os.path.splitext(file)
-        #print fileExtension -- loaded twice?
-        if fileExtension == ".srt":
-            self.loadSubsSrt(file)
-            self.ext = ".srt"
-        if fileExtension == ".ass":
-            self.loadSubsAss(file)
-            self.ext = ".ass"
+            #scroll to option. should center current item in list though.
+            self.scrollToItem(self.item(timeline.row), QAbstractItemView.EnsureVisible)
 
-    def gotoLine(self):
-        if self.ext == ".srt":
-            self.gotoLineSrt()
-        if self.ext == ".ass":
-            self.gotoLineAss()
+            # Update LineDefs panel
+            self.lineDefs.lookup(timeline.row)
 
 class QPlayer(QWidget):
     def __init__(self, settings):
@@ -172,7 +205,7 @@ class QPlayer(QWidget):
         self.player = Phonon.MediaObject(self)
         Phonon.createPath(self.player, self.audioOuptut)
 
-        self.videoWidget = cVideoWidget()
+        self.videoWidget = cVideoWidget(self.player)
         Phonon.createPath(self.player, self.videoWidget)
 
         self.player.setTickInterval(500)  #1000
@@ -185,6 +218,7 @@ class QPlayer(QWidget):
         self.buildGUI()
         self.setupConnections()
         self.init = True # used to test before loading file when PLAY is pushed
+        self.transcript = None # transcript list following playback, set up by the main window
 
         # load a subtitle test
         #self.mediaobject = Phonon.MediaObject()
@@ -239,59 +273,16 @@ class QPlayer(QWidget):
         #self.mController.availableSubtitlesChanged.connect(self.subsChanged)
         #self.videoWidget.stateChanged.connect(self.vidStateChanged)
 
-    def tick(self, time):  # transcript list hi-lite following
+    @profiling.handler
+    def tick(self, time):
         displayTime = QtCore.QTime(0, (time / 60000) % 60, (time / 1000) % 60)
         self.lcdTimer.display(displayTime.toString('mm:ss'))
-        """
-        print "time             : ", time
-        print
-        print ">current row     : ", w.currentRow
-        print " currentSubStart : ", w.currentSubStart
-        print " currentSubEnd   : ", w.currentSubEnd
-        print " nextSubStart    : ", w.nextSubStart
-        print " nextSubEnd      : ", w.nextSubEnd
-        print "***************"
-        """
-
-        if time > subsList.currentSubEnd:
-            subsList.item(subsList.currentRow).setBackground(QColor('grey'))
-
-        if time > subsList.nextSubStart:
-
-            if subsList.ext == ".srt":
-                subsList.currentRow = subsList.currentRow + 1
-                i = subsList.subs[subsList.currentRow]
-                subsList.currentSubStart = i.start.ordinal
-                subsList.currentSubEnd = i.end.ordinal
-                n = subsList.subs[subsList.currentRow + 1]
-                subsList.nextSubStart = n.start.ordinal
-                subsList.nextSubEnd = n.end.ordinal
-
-            if subsList.ext == ".ass":
-                subsList.currentRow = subsList.currentRow + 1
-                i = subsList.subs[subsList.currentRow]
-                subsList.currentSubStart = i.start.total_seconds() * 1000# + i.start.microseconds
-                subsList.currentSubEnd = i.end.total_seconds() * 1000# + i.end.microseconds
-                n = subsList.subs[subsList.currentRow + 1]
-                subsList.nextSubStart = n.start.total_seconds() * 1000# + n.start.microseconds
-                subsList.nextSubEnd = n.end.total_seconds() * 1000# + n.end.microseconds
-                #print str(n.end.total_seconds()) + " : " + str(n.end.microseconds)
-
-            subsList.item(subsList.currentRow - 1).setBackground(QColor('white'))
-            subsList.item(subsList.currentRow).setBackground(QColor('red'))
-
-            # browser text
-            # w.body.appendInside("<span>" + w.subs[w.currentRow].text + "</span>")
-            #w.span.setPlainText( w.subs[w.currentRow].text)
 
-            #scroll to option. should center current item in list though.
-            subsList.ScrollHint = QAbstractItemView.EnsureVisible
-            subsList.scrollToItem(subsList.item(subsList.currentRow), subsList.ScrollHint)
-
-            # Update LineDefs panel
-            LineDefs.lookup(subsList.currentRow)
+        if self.transcript is not None:
+            self.transcript.follow(time)
 
 
+    @profiling.handler
     def playClicked(self):  # Set video file at first play click
         if self.init:
             self.player.setCurrentSource(Phonon.MediaSource(self.fileEdit))
@@ -317,8 +308,9 @@ class QPlayer(QWidget):
             self.playButton.setEnabled(False)
 
 class cVideoWidget(Phonon.VideoWidget):
-    def __init__(self):
+    def __init__(self, player):
         super(cVideoWidget, self).__init__()
+        self.player = player
         self.FS = False
 
     def mouseDoubleClickEvent(self, event):  # Fullscreen toggle
@@ -339,20 +331,20 @@ class cVideoWidget(Phonon.VideoWidget):
                 self.FS = True
 
         if event.key() == QtCore.Qt.Key_Space:  # Pause with space
-            if qp.player.state() == Phonon.PausedState:
-                qp.player.play()
+            if self.player.state() == Phonon.PausedState:
+                self.player.play()
             else:
-                qp.player.pause()
+                self.player.pause()
 
         if event.key() == QtCore.Qt.Key_Right:
-            time = qp.player.currentTime()
+            time = self.player.currentTime()
             time += 5000
-            qp.player.seek(time)
+            self.player.seek(time)
 
         if event.key() == QtCore.Qt.Key_Left:
-            time = qp.player.currentTime()
+            time = self.player.currentTime()
             time -= 5000
-            qp.player.seek(time)
+            self.player.seek(time)
 
 class cDockKanji(QDockWidget):
     def __init__(self):
@@ -379,7 +371,92 @@ class cDockKanji(QDockWidget):
         self.setWidget(self.dockWidgetContents)
         self.setWindowTitle("Kanji")
 
-class cDockVocab(QDockWidget):
+class cDockInstrument(QDockWidget):
+    # lookup latency per stage (TP_INSTRUMENT=1 or --instrument)
+    def __init__(self):
+        super(cDockInstrument, self).__init__()
+
+        self.dockWidgetContents = QWidget()
+        self.verticalLayout = QVBoxLayout(self.dockWidgetContents)
+
+        self.table = QTableWidget(0, 6, self.dockWidgetContents)
+        self.table.setHorizontalHeaderLabels(["Stage", "Samples", "Mean", "p50", "p95", "p99"])
+        self.table.verticalHeader().hide()
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.verticalLayout.addWidget(self.table)
+
+        self.horizontalLayout = QHBoxLayout()
+        self.checkRecord = QCheckBox("Record", self.dockWidgetContents)
+        self.checkRecord.setChecked(instrument.enabled)
+        self.checkRecord.toggled.connect(self.setRecording)
+        self.horizontalLayout.addWidget(self.checkRecord)
+        self.btnReset = QPushButton("Reset", self.dockWidgetContents)
+        self.btnReset.clicked.connect(self.reset)
+        self.horizontalLayout.addWidget(self.btnReset)
+        self.btnExport = QPushButton("Export CSV", self.dockWidgetContents)
+        self.btnExport.clicked.connect(self.export)
+        self.horizontalLayout.addWidget(self.btnExport)
+        self.verticalLayout.addLayout(self.horizontalLayout)
+
+        self.setWidget(self.dockWidgetContents)
+        self.setWindowTitle("Lookup Timings")
+
+        # percentiles sort every window, so only refresh while visible
+        self.timer = QtCore.QTimer(self)
+        self.timer.setInterval(1000)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start()
+
+    def setRecording(self, checked):
+        instrument.enabled = checked
+
+    def reset(self):
+        instrument.reset()
+        self.refresh()
+
+    def refresh(self):
+        if not self.isVisible():
+            return
+
+        rows = instrument.report()
+        self.table.setRowCount(len(rows))
+        for row, (name, count, mean, p50, p95, p99) in enumerate(rows):
+            values = [name, str(count)]
+            if name.endswith('.queries'):
+                values += ['{0:.1f}'.format(value) for value in (mean, p50, p95, p99)]
+            else:
+                values += ['{0:.3f} ms'.format(value) for value in (mean, p50, p95, p99)]
+            for column, value in enumerate(values):
+                self.table.setItem(row, column, QTableWidgetItem(value))
+
+    def export(self):
+        filename, _ = QFileDialog.getSaveFileName(self, "Export Lookup Timings", "", "CSV (*.csv)")
+        if filename != "":
+            instrument.exportCsv(filename)
+
+class cBatchedUpdate(object):
+    # settingsupdate* calls between beginUpdate and endUpdate only record values;
+    # refresh then runs the panel's applyUpdate once at the end
+    updateDepth = 0
+    updatePending = False
+
+    def beginUpdate(self):
+        self.updateDepth += 1
+
+    def endUpdate(self):
+        self.updateDepth -= 1
+        if self.updateDepth == 0 and self.updatePending:
+            self.updatePending = False
+            self.refresh()
+
+    def refresh(self):
+        if self.updateDepth > 0:
+            self.updatePending = True
+            return
+
+        self.applyUpdate()
+
+class cDockVocab(cBatchedUpdate, QDockWidget):
     def __init__(self, settings):
         super(cDockVocab, self).__init__()
 
@@ -413,6 +490,14 @@ class cDockVocab(QDockWidget):
         self.elh = 0
         self.rlh = 0
         self.glh = 0
+        self.renderer = rendering.Renderer(rendering.VOCAB_STYLE)
+        self.lookupLine = None # set up by the main window
+        self.restyle()
+
+    def applyUpdate(self):
+        self.restyle()
+        if self.lookupLine is not None:
+            self.lookupLine.updateVocabDefs()
 
     def settingsupdateEx(self, eft, efs, efg, bg, elh):
         self.eft = eft
@@ -420,7 +505,7 @@ class cDockVocab(QDockWidget):
         self.efg = efg
         self.bg = bg
         self.elh = elh
-        lookupLine.updateVocabDefs()
+        self.refresh()
 
     def settingsupdateRe(self, rft, rfs, rfg, bg, rlh):
         self.rft = rft
@@ -428,7 +513,7 @@ class cDockVocab(QDockWidget):
         self.rfg = rfg
         self.bg = bg
         self.rlh = rlh
-        lookupLine.updateVocabDefs()
+        self.refresh()
 
     def settingsupdateGl(self, gft, gfs, gfg, bg, glh):
         self.gft = gft
@@ -436,98 +521,27 @@ class cDockVocab(QDockWidget):
         self.gfg = gfg
         self.bg = bg
         self.glh = glh
-        lookupLine.updateVocabDefs()
-
-    def buildDefHeader(self):
-
-        return u"""
-                <html><head><style>
-                body {{ background-color: {0} }}
-                span.expression {{ font-size: {1}px; font-family: '{2}'; color: {3}; line-height: {10}px }}
-                span.reading {{ font-size: {4}px; font-family: '{5}'; color: {6}; line-height: {11}px }}
-                span.glossary {{ font-size: {7}px; font-family: '{8}'; color: {9}; line-height: {12}px }}
-                </style></head><body>""".format(self.bg, self.efs, self.eft, self.efg, self.rfs, self.rft, self.rfg, self.gfs, self.gft, self.gfg, self.elh, self.rlh, self.glh) #+ html + "</body></html>"
-
-    def buildDefFooter(self):
-        return '</body></html>'
-
-
-    def buildEmpty(self):
-        return u"""
-            <p>No definitions to display.</p>
-            <p>Mouse over text with the <em>middle mouse button</em> or <em>shift key</em> pressed to search.</p>
-            <p>You can also also input terms in the search box below."""
-
-
-    def buildVocabDef(self, definition, index, query):
-        reading = unicode()
-        if definition['reading']:
-            reading = u'<span class = "reading">[{0}]<br/></span>'.format(definition['reading'])
-
-        rules = unicode()
-        if len(definition['rules']) > 0:
-            rules = ' &lt; '.join(definition['rules'])
-            rules = '<span class = "rules">({0})<br/></span>'.format(rules)
-
-        links = '<a href = "copyVocabDef:{0}"><img src = "img/icon_add_expression.png" align = "right"/></a>'.format(index)
-        if query is not None:
-            if query('vocab', yomi_base.reader_util.markupVocabExp(definition)):
-                links += '<a href = "addVocabExp:{0}"><img src = "://img/img/icon_add_expression.png" align = "right"/></a>'.format(index)
-            if query('vocab', yomi_base.reader_util.markupVocabReading(definition)):
-                links += '<a href = "addVocabReading:{0}"><img src = "://img/img/icon_add_reading.png" align = "right"/></a>'.format(index)
-
-        html = u"""
-            <span class = "links">{0}</span>
-            <span class = "expression">{1}<br/></span>
-            {2}
-            <span class = "glossary">{3}<br/></span>
-            {4}
-            <br clear = "all"/>""".format(links, definition['expression'], reading, definition['glossary'], rules)
-        #print html
-        return html
+        self.refresh()
 
+    def restyle(self):
+        self.renderer.setTheme(bg=self.bg, eft=self.eft, efs=self.efs, efg=self.efg, elh=self.elh,
+                               rft=self.rft, rfs=self.rfs, rfg=self.rfg, rlh=self.rlh,
+                               gft=self.gft, gfs=self.gfs, gfg=self.gfg, glh=self.glh)
 
     def buildVocabDefs(self, definitions, query):
-        html = self.buildDefHeader()
-        if len(definitions) > 0:
-            for i, definition in enumerate(definitions):
-                html += self.buildVocabDef(definition, i, query)
-        else:
-            html += self.buildEmpty()
-
-        return html + self.buildDefFooter()
-
-
-    def buildKanjiDef(self, definition, index, query):
-        links = '<a href = "copyKanjiDef:{0}"><img src = "://img/img/icon_copy_definition.png" align = "right"/></a>'.format(index)
-        if query is not None and query('kanji', yomi_base.reader_util.markupKanji(definition)):
-            links += '<a href = "addKanji:{0}"><img src = "://img/img/icon_add_expression.png" align = "right"/></a>'.format(index)
-
-        readings = ', '.join([definition['kunyomi'], definition['onyomi']])
-        html = u"""
-            <span class = "links">{0}</span>
-            <span class = "expression">{1}<br/></span>
-            <span class = "reading">[{2}]<br/></span>
-            <span class = "glossary">{3}<br/></span>
-            <br clear = "all"/>""".format(links, definition['character'], readings, definition['glossary'])
-
-        return html
-
+        return self.renderer.vocabDefs(definitions, query)
 
     def buildKanjiDefs(self, definitions, query):
-        html = self.buildDefHeader()
-
-        if len(definitions) > 0:
-            for i, definition in enumerate(definitions):
-                html += self.buildKanjiDef(definition, i, query)
-        else:
-            html += self.buildEmpty()
-
-        return html + self.buildDefFooter()
+        return self.renderer.kanjiDefs(definitions, query)
 
 class cDockDirSelect(QDockWidget):
-    def __init__(self, session):
+    def __init__(self, session, player, subsList, lineDefs, dockSettings, statusbar):
         super(cDockDirSelect, self).__init__()
+        self.player = player
+        self.subsList = subsList
+        self.lineDefs = lineDefs
+        self.dockSettings = dockSettings
+        self.statusbar = statusbar
 
         self.dockWidgetContents = QWidget()
         self.horizontalLayout = QHBoxLayout(self.dockWidgetContents)
@@ -566,19 +580,19 @@ class cDockDirSelect(QDockWidget):
         #self.btnLoad = QPushButton(self.dockWidgetContents)
         #self.btnLoad.setText("Load")
         #self.horizontalLayout.addWidget(self.btnLoad)
-        #self.btnLoad.clicked.connect(LineDefs.loaddefs)
+        #self.btnLoad.clicked.connect(self.lineDefs.loaddefs)
         #self.btnLoad.setDisabled(True)
 
         self.btnSave = QPushButton(self.dockWidgetContents)
         self.btnSave.setText("Save Def")
         self.horizontalLayout.addWidget(self.btnSave)
-        self.btnSave.clicked.connect(LineDefs.savedefs)
+        self.btnSave.clicked.connect(self.lineDefs.savedefs)
         self.btnSave.setDisabled(True)
 
         self.btnCreate = QPushButton(self.dockWidgetContents)
         self.btnCreate.setText("Create Def")
         self.horizontalLayout.addWidget(self.btnCreate)
-        self.btnCreate.clicked.connect(LineDefs.createdefs)
+        self.btnCreate.clicked.connect(self.lineDefs.createdefs)
         self.btnCreate.setDisabled(True)
 
         self.btnSettings = QPushButton(self.dockWidgetContents)
@@ -621,31 +635,34 @@ class cDockDirSelect(QDockWidget):
 
 
     def settingsPanel(self):
-        if dockSettings.isVisible():
-            dockSettings.setVisible(False)
+        if self.dockSettings.isVisible():
+            self.dockSettings.setVisible(False)
         else:
-            dockSettings.setVisible(True)
+            self.dockSettings.setVisible(True)
             #w.tabifyDockWidget(dockSettings, dockVideo)
             # setfocus
 
+    @profiling.handler
     def setvideofile(self):
         if self.comboVideo.currentText() != "":
-            qp.init = True  # reset video source
-            qp.fileEdit = self.comboVideoDir + "/" + self.comboVideo.currentText()
-            statusbar.showMessage("Video File Loaded: " + qp.fileEdit)
+            self.player.init = True  # reset video source
+            self.player.fileEdit = self.comboVideoDir + "/" + self.comboVideo.currentText()
+            self.statusbar.showMessage("Video File Loaded: " + self.player.fileEdit)
 
+    @profiling.handler
     def settranscrfile(self):
         if self.comboTranscr.currentText() != "":
             fn = self.comboTranscrDir + "/" + self.comboTranscr.currentText()
-            subsList.loadSubs(fn)
-            statusbar.showMessage("Transcript File Loaded: " + fn)
+            self.subsList.loadSubs(fn)
+            self.statusbar.showMessage("Transcript File Loaded: " + fn)
 
+    @profiling.handler
     def setdefsfile(self):
         if self.comboDefs.currentText() != "":
-            LineDefs.filename = self.comboDefsDir + "/" + self.comboDefs.currentText()
+            self.lineDefs.filename = self.comboDefsDir + "/" + self.comboDefs.currentText()
             #self.btnLoad.setDisabled(False)
             self.btnSave.setDisabled(False)
-            LineDefs.loaddefs()
+            self.lineDefs.loaddefs()
 
     def showDialogV(self):
         self.showdialog("mp4,mkv", self.comboVideo,"Video")
@@ -685,21 +702,23 @@ class cDockDirSelect(QDockWidget):
         combo.addItems(files)
 
         if text == "Definitions":
-            LineDefs.basedir = dir
+            self.lineDefs.basedir = dir
             self.btnCreate.setDisabled(False)
 
-        statusbar.showMessage(text + " Folder set to: " + dir)
+        self.statusbar.showMessage(text + " Folder set to: " + dir)
 
-class cLineDefs(QTextBrowser):
+class cLineDefs(cBatchedUpdate, QTextBrowser):
     def __init__(self, settings):
         super(cLineDefs, self).__init__()
-        self.TranscriptLine = list()
-        self.Expression = list()
-        self.Reading = list()
-        self.Glossary = list()
+        self.store = DefsStore() # in memory until a .tdef file is selected or created
         self.Result = ""
         self.filename = ""
         self.basedir = ""
+
+        # set up by the main window
+        self.timeline = Timeline()
+        self.dirSelect = None
+        self.statusbar = None
         # font = QFont()
         # font.setPointSize(16)
         # self.setFont(font)
@@ -721,13 +740,48 @@ class cLineDefs(QTextBrowser):
         self.rlh = 0
         self.glh = 0
 
+        # what the panel currently shows: line, its (id, expression, reading, glossary)
+        # rows and a cursor selecting each definition's block in the document
+        self.shownLine = None
+        self.shownDefs = list()
+        self.blocks = dict()
+        self.renderer = rendering.Renderer(rendering.LINE_STYLE)
+
+        # upcoming lines are rendered ahead in idle time: line -> (rows, fragments)
+        self.prefetchDepth = constants.c['prefetchDepth']
+        self.prefetchCacheSize = constants.c['prefetchCacheSize']
+        self.prefetched = collections.OrderedDict()
+        self.prefetchQueue = list()
+        self.prefetchTimer = QtCore.QTimer(self)
+        self.prefetchTimer.setInterval(0)
+        self.prefetchTimer.timeout.connect(self.prefetchNext)
+
+        self.restyle()
+
+    def applyUpdate(self):
+        self.restyle()
+        self.lookup(self.timeline.row)
+
+    def restyle(self):
+        palette = self.palette()
+        palette.setColor(QPalette.Base, QColor(self.bg))
+        self.setPalette(palette)
+
+        # applies to html inserted from now on, so the panel is rebuilt on next lookup
+        if self.renderer.setTheme(bg=self.bg, eft=self.eft, efs=self.efs, efg=self.efg, elh=self.elh,
+                                  rft=self.rft, rfs=self.rfs, rfg=self.rfg, rlh=self.rlh,
+                                  gft=self.gft, gfs=self.gfs, gfg=self.gfg, glh=self.glh):
+            self.document().setDefaultStyleSheet(self.renderer.stylesheet)
+            self.shownLine = None
+            self.prefetched.clear()
+
     def settingsupdateEx(self, eft, efs, efg, bg, elh):
         self.eft = eft
         self.efs = efs
         self.efg = efg
         self.bg = bg
         self.elh = elh
-        self.lookup(subsList.currentRow)
+        self.refresh()
 
     def settingsupdateRe(self, rft, rfs, rfg, bg, rlh):
         self.rft = rft
@@ -735,7 +789,7 @@ class cLineDefs(QTextBrowser):
         self.rfg = rfg
         self.bg = bg
         self.rlh = rlh
-        self.lookup(subsList.currentRow)
+        self.refresh()
 
     def settingsupdateGl(self, gft, gfs, gfg, bg, glh):
         self.gft = gft
@@ -743,8 +797,9 @@ class cLineDefs(QTextBrowser):
         self.gfg = gfg
         self.bg = bg
         self.glh = glh
-        self.lookup(subsList.currentRow)
+        self.refresh()
 
+    @profiling.handler
     def onDefsAnchorClicked(self, url):
         #print "here: " + url.toString()
         command, index = unicode(url.toString()).split(':')
@@ -752,113 +807,152 @@ class cLineDefs(QTextBrowser):
 
     def executeDefsCommand(self, command, index):
         if command == 'deleteDef':
-            #print "removing: <" + str(index) + "> " + str(self.TranscriptLine[index]) + " " + self.Expression[index]
-            del self.TranscriptLine[index]
-            del self.Expression[index]
-            del self.Reading[index]
-            del self.Glossary[index]
-            self.lookup(subsList.currentRow)
+            self.store.delete(index)
+            self.lookup(self.timeline.row)
 
         if command == 'editDef':
-            #print "editing: <" + str(index) + "> " + str(self.TranscriptLine[index]) + " " + self.Expression[index]
-            editDialog(self.Glossary[index], index).exec_()
-            #print text
+            editDialog(self.store.glossary(index), index, self).exec_()
 
+    @profiling.handler
     def createdefs(self):
         # get new filename from input dialog
-        # set as current filename(.tdef), create new empty file
+        # set as current filename(.tdef), copy current defs into the new file
         # add new file to combobox and set it as current
         text, ok = QInputDialog.getText(self, "Create Definitions File", "File name:", QLineEdit.Normal, "")
         if ok and text != '':
-            self.filename = self.basedir + "/" + text + ".tdef"
-            file = open(self.filename, 'w')
-            data = {'TranscriptLine': self.TranscriptLine, 'Expression': self.Expression, 'Reading': self.Reading, 'Glossary': self.Glossary}
-            pickle.dump(data, file)
-            file.close()
-
-            dockDirSelect.comboDefs.addItem(text + ".tdef") # hacky, avoids re-query of dir
-            index = dockDirSelect.comboDefs.findText(text + ".tdef")
-            dockDirSelect.comboDefs.setCurrentIndex(index)
-            statusbar.showMessage("New Definitions File Created: " + self.filename)
-
+            filename = self.basedir + "/" + text + ".tdef"
+            try:
+                self.store.copyTo(filename).close()
+            except ValueError, e:
+                self.statusbar.showMessage("Definitions File Not Created: {0}".format(e))
+                return
+            self.filename = filename
+
+            self.dirSelect.comboDefs.addItem(text + ".tdef") # hacky, avoids re-query of dir
+            index = self.dirSelect.comboDefs.findText(text + ".tdef")
+            self.dirSelect.comboDefs.setCurrentIndex(index)
+            self.statusbar.showMessage("New Definitions File Created: " + self.filename)
+
+    @profiling.handler
     def loaddefs(self):
-        file = open(self.filename, 'r')
-        data = pickle.load(file)
-        file.close()
-        #print "file closed"
-        self.TranscriptLine = data['TranscriptLine']
-        self.Expression = data['Expression']
-        self.Reading = data['Reading']
-        self.Glossary = data['Glossary']
-        statusbar.showMessage("Definitions File Loaded: " + self.filename)
-
+        # old pickled .tdef files are converted on first open (original kept as .tdef.bak)
+        try:
+            store = DefsStore(self.filename)
+        except ValueError, e:
+            self.filename = self.store.filename if self.store.filename != ':memory:' else ""
+            self.statusbar.showMessage("Definitions File Not Loaded: {0}".format(e))
+            return
+        self.store.close()
+        self.store = store
+        self.shownLine = None
+        self.prefetched.clear()
+        self.statusbar.showMessage("Definitions File Loaded: " + self.filename)
+
+    @profiling.handler
     def savedefs(self):
+        # adds, edits and deletes are written as they happen; this only compacts the file
         if self.filename != "":
-            file = open(self.filename, 'w')
-            data = {'TranscriptLine': self.TranscriptLine, 'Expression': self.Expression, 'Reading': self.Reading, 'Glossary': self.Glossary}
-            pickle.dump(data, file)
-            file.close()
-            statusbar.showMessage("Definitions File Saved: " + self.filename)
+            self.store.compact()
+            self.statusbar.showMessage("Definitions File Saved: " + self.filename)
+
+    def edit(self, index, glossary):
+        self.store.edit(index, glossary)
+        self.lookup(self.timeline.row)
 
     def add(self, expression, reading, glossary):
-        line = subsList.currentRow
-        self.TranscriptLine.append(line)
-        self.Expression.append(expression)
-        self.Reading.append(reading)
-        self.Glossary.append(glossary)
+        line = self.timeline.row
+        self.store.add(line, expression, reading, glossary)
 
         self.lookup(line)
 
     def lookup(self, line):
-        #self.clear() # clear linedefs and append matching defs for transcript line
-        LineDefs.setHtml(u"""<html><head><style>body {{ background-color: {0} }})
-                                        </style></head><body></body></html>""".format(self.bg))
-
-        if line in self.TranscriptLine:
-            index = list()
-            for z in range(len(self.TranscriptLine)):
-                if line == self.TranscriptLine[z]:
-                    index.append(z)
-
-            html = unicode()
-            for z in range(len(index)):
-                html += self.buildDef(self.Expression[index[z]], self.Reading[index[z]], self.Glossary[index[z]], index[z])
-
-            LineDefs.setHtml(self.wrapDefs(html))
-            #LineDefs.append(self.wrapDefs(html))
-            print self.wrapDefs(html)
-
-    def buildDef(self, expression, reading, glossary, index):
-        reading = u'<span class = "reading">[{0}]</span>'.format(reading)
-        links = '<a href = "deleteDef:{0}"><img src = "img/icon_action_quit.png" align = "right"/></a>'.format(index)
-        links += '<a><img src = "img/empty.png" align = "right"/></a>'
-        links += '<a href = "editDef:{0}"><img src = "img/icon_action_zoom_reset.png" align = "right"/></a>'.format(index)
-
-        html = u"""
-            <span class = "links">{0}</span>
-            <span class = "expression">{1}</span>
-            {2}
-            <span class = "glossary"><br/>{3}</span>
-            <br clear = "all"/><br/>""".format(links, expression, reading, glossary)
-        return html
-
-    def wrapDefs(self, html):
-        # ; color: {0}; font-size: 16pt;
-        return u"""
-            <html><head><style>
-            body {{ background-color: {0} }}
-            span.expression {{ font-size: {1}px; font-family: '{2}'; color: {3}; letter-spacing: {10}px }}
-            span.reading {{ font-size: {4}px; font-family: '{5}'; color: {6}; letter-spacing: {11}px }}
-            span.glossary {{ font-size: {7}px; font-family: '{8}'; color: {9}; letter-spacing: {12}px }}
-            </style></head><body>""".format(self.bg, self.efs, self.eft, self.efg, self.rfs, self.rft, self.rfg, self.gfs, self.gft, self.gfg,self.elh,self.rlh,self.glh) + html + "</body></html>"
-
-            #.format('green', 15, 'serif', 'green', 12, 'serif', 'blue', 10, 'serif','gray') + html + "</body></html>"
-            #body {{ background-color: {0} }}
+        # only touch the blocks that changed since the last lookup of this line
+        defs = self.store.findLine(line)
+        if line == self.shownLine and defs == self.shownDefs:
+            return
+
+        if line != self.shownLine:
+            cursor = QTextCursor(self.document())
+            cursor.select(QTextCursor.Document)
+            cursor.removeSelectedText()
+            self.shownLine = line
+            self.shownDefs = list()
+            self.blocks = dict()
+
+            # swap in what was prepared for this line if its defs did not change since
+            rows, fragments = self.prefetched.pop(line, (None, None))
+            if rows == defs:
+                for row, fragment in zip(defs, fragments):
+                    self.insertDef(self.document().characterCount() - 1, row, fragment)
+                self.shownDefs = defs
+                self.prefetch(line)
+                return
+
+        shown = dict((row[0], row) for row in self.shownDefs)
+        current = dict((row[0], row) for row in defs)
+
+        for index in shown:
+            if index not in current:
+                self.blocks.pop(index).removeSelectedText()
+
+        for row in defs:
+            index = row[0]
+            if index not in shown:
+                self.insertDef(self.document().characterCount() - 1, row)
+            elif shown[index] != row:
+                block = self.blocks[index]
+                position = block.selectionStart()
+                block.removeSelectedText()
+                self.insertDef(position, row)
+
+        self.shownDefs = defs
+        self.prefetch(line)
+
+    def buildFragment(self, row):
+        index, expression, reading, glossary = row
+        html = self.renderer.lineDef(expression, reading, glossary, index)
+        return QTextDocumentFragment.fromHtml(html, self.document()) # parsed with the default style sheet
+
+    def insertDef(self, position, row, fragment=None):
+        if fragment is None:
+            fragment = self.buildFragment(row)
+
+        index = row[0]
+        cursor = QTextCursor(self.document())
+        cursor.setPosition(position)
+        cursor.insertFragment(fragment)
+
+        # keep the selection on this block while text is inserted right after it
+        block = QTextCursor(self.document())
+        block.setPosition(position)
+        block.setPosition(cursor.position(), QTextCursor.KeepAnchor)
+        block.setKeepPositionOnInsert(True)
+        self.blocks[index] = block
+
+    def prefetch(self, line):
+        last = min(line + self.prefetchDepth, len(self.timeline) - 1)
+        self.prefetchQueue = [l for l in xrange(line + 1, last + 1) if l not in self.prefetched]
+        if self.prefetchQueue:
+            self.prefetchTimer.start()
+
+    @profiling.handler
+    def prefetchNext(self):
+        # one line per timeout so playback and input are never held up
+        if not self.prefetchQueue:
+            self.prefetchTimer.stop()
+            return
+
+        line = self.prefetchQueue.pop(0)
+        rows = self.store.findLine(line)
+        self.prefetched[line] = rows, [self.buildFragment(row) for row in rows]
+        while len(self.prefetched) > self.prefetchCacheSize:
+            self.prefetched.popitem(last=False)
 
 class editDialog(QDialog):
-    def __init__(self, text, index):
+    def __init__(self, text, index, lineDefs):
         super(editDialog, self).__init__()
         self.index = index
+        self.lineDefs = lineDefs
         self.texteditor = QTextEdit()
         font = QFont()
         font.setPointSize(12)
@@ -881,16 +975,23 @@ class editDialog(QDialog):
         self.setWindowTitle("Edit Definition")
         self.show()
 
+    @profiling.handler
     def btnOKclicked(self):
-        LineDefs.Glossary[self.index] = self.texteditor.toPlainText()
-        LineDefs.lookup(subsList.currentRow)
+        self.lineDefs.edit(self.index, self.texteditor.toPlainText())
         self.close()
 
     def btnCancelclicked(self):
         self.close()
 
 class cSession():
-    def __init__(self):
+    def __init__(self, statusbar):
+        self.statusbar = statusbar
+
+        # set up by the main window
+        self.dirSelect = None
+        self.settings = None
+        self.lineDefs = None
+
         self.TranscrDir = ""
         self.DefsDir = ""
         self.VideoDir = ""
@@ -902,22 +1003,22 @@ class cSession():
 
     def save(self):
         file = open((QtCore.QDir.currentPath() + "/session"), 'w')
-        data = {'comboTranscrDir': dockDirSelect.comboTranscrDir,
-                'comboDefsDir': dockDirSelect.comboDefsDir,
-                'comboVideoDir': dockDirSelect.comboVideoDir,
-                'ThemeDir': Settings.ThemeDir,
-                'defsfile': dockDirSelect.comboDefs.currentText(),    # .currentIndex(),
-                'transcrfile': dockDirSelect.comboTranscr.currentText(),
-                'videofile': dockDirSelect.comboVideo.currentText(),
-                'themefile': Settings.comboTheme.currentText()}
+        data = {'comboTranscrDir': self.dirSelect.comboTranscrDir,
+                'comboDefsDir': self.dirSelect.comboDefsDir,
+                'comboVideoDir': self.dirSelect.comboVideoDir,
+                'ThemeDir': self.settings.ThemeDir,
+                'defsfile': self.dirSelect.comboDefs.currentText(),    # .currentIndex(),
+                'transcrfile': self.dirSelect.comboTranscr.currentText(),
+                'videofile': self.dirSelect.comboVideo.currentText(),
+                'themefile': self.settings.comboTheme.currentText()}
 
         pickle.dump(data, file)
         file.close()
 
         # automatic save defs on close. not sure about this ....
-        LineDefs.savedefs()
+        self.lineDefs.savedefs()
 
-        #statusbar.showMessage("Session File Saved: " + (QtCore.QDir.currentPath() + "/session"), 2000)
+        #self.statusbar.showMessage("Session File Saved: " + (QtCore.QDir.currentPath() + "/session"), 2000)
         print "Session File Saved: " + (QtCore.QDir.currentPath() + "/session")
         # subsList.currentRow
         # video position
@@ -937,73 +1038,106 @@ class cSession():
             self.VideoFile = data['videofile']
             self.ThemeFile = data['themefile']
 
-            statusbar.showMessage("Session Restored: " + (QtCore.QDir.currentPath() + "/session"))
-            statusbar.showMessage("ThemeFile Restored: " + self.ThemeFile)
+            self.statusbar.showMessage("Session Restored: " + (QtCore.QDir.currentPath() + "/session"))
+            self.statusbar.showMessage("ThemeFile Restored: " + self.ThemeFile)
         finally: # in case no session file yet
             return None
 
+def shown():
+    # the event loop is running, so the window has been shown
+    profiling.mark('first window')
+    startup.report()
+
 if __name__ == "__main__":
-    qapp = QApplication(sys.argv)
-    qapp.setStyle("cleanlooks")
-    w = QMainWindow()
+    startup.mark('imports done')
+    with startup.phase('QApplication'):
+        qapp = profiling.createApplication(sys.argv)
+        qapp.setStyle("cleanlooks")
+        w = QMainWindow()
 
-    w.setWindowTitle("Trans-Player-Desktop v0.3")
-    statusbar = QStatusBar(w)
-    w.setStatusBar(statusbar)
+        w.setWindowTitle("Trans-Player-Desktop v0.3")
+        statusbar = QStatusBar(w)
+        w.setStatusBar(statusbar)
 
 # Restore Session
-    Session = cSession()
-    #session.restore()
-    Session.load()
-    qapp.aboutToQuit.connect(Session.save)
+    with startup.phase('Session'):
+        Session = cSession(statusbar)
+        #session.restore()
+        Session.load()
+        qapp.aboutToQuit.connect(Session.save)
 
 # Settings
-    dockSettings = QDockWidget("Settings")
-    Settings =  cSettings(Session)
-    dockSettings.setWidget(Settings)
-    dockSettings.setVisible(False)
-    w.addDockWidget(QtCore.Qt.LeftDockWidgetArea, dockSettings)
+    with startup.phase('Settings'):
+        dockSettings = QDockWidget("Settings")
+        Settings =  cSettings(Session)
+        dockSettings.setWidget(Settings)
+        dockSettings.setVisible(False)
+        w.addDockWidget(QtCore.Qt.LeftDockWidgetArea, dockSettings)
 
 # Video Player
-    dockVideo = QDockWidget("Video Player")
-    qp = QPlayer(Settings) # videodir/videofile
-    dockVideo.setWidget(qp)
-    dockVideo.setMinimumWidth(500)
-    w.addDockWidget(QtCore.Qt.LeftDockWidgetArea, dockVideo)
-    ##w.tabifyDockWidget(dockSettings, dockVideo)
-    #w.tabifyDockWidget(dockVideo, dockSettings)
+    with startup.phase('QPlayer'):
+        dockVideo = QDockWidget("Video Player")
+        qp = QPlayer(Settings) # videodir/videofile
+        dockVideo.setWidget(qp)
+        dockVideo.setMinimumWidth(500)
+        w.addDockWidget(QtCore.Qt.LeftDockWidgetArea, dockVideo)
+        ##w.tabifyDockWidget(dockSettings, dockVideo)
+        #w.tabifyDockWidget(dockVideo, dockSettings)
 
 # Transcript List
-    subsList = cSubsList(Settings) # font, fgcolor, bgcolor
-    subsList.itemDoubleClicked.connect(subsList.gotoLine)
-    w.setCentralWidget(subsList)
+    with startup.phase('cSubsList'):
+        subsList = cSubsList(Settings) # font, fgcolor, bgcolor
+        subsList.itemDoubleClicked.connect(subsList.gotoLine)
+        subsList.player = qp.player
+        qp.transcript = subsList
+        w.setCentralWidget(subsList)
 
 # Vocab and Kanji
-    dockVocab = cDockVocab(Settings) # font, fgcolor, bgcolor, maxwinht
-    w.addDockWidget(QtCore.Qt.RightDockWidgetArea, dockVocab)
-    dockKanji = cDockKanji()
-    w.addDockWidget(QtCore.Qt.RightDockWidgetArea, dockKanji)
-    dockKanji.hide()
+    with startup.phase('cDockVocab, cDockKanji'):
+        dockVocab = cDockVocab(Settings) # font, fgcolor, bgcolor, maxwinht
+        w.addDockWidget(QtCore.Qt.RightDockWidgetArea, dockVocab)
+        dockKanji = cDockKanji()
+        w.addDockWidget(QtCore.Qt.RightDockWidgetArea, dockKanji)
+        dockKanji.hide()
 
 # Line Defs -- add defs load/save
-    LineDefs = cLineDefs(Settings) # font, fgcolor, bgcolor, maxwinht
-    dockLineDefs = QDockWidget("Definitions")
-    dockLineDefs.setWidget(LineDefs)
-    LineDefs.setMinimumWidth(250) # sets the whole right side
+    with startup.phase('cLineDefs'):
+        LineDefs = cLineDefs(Settings) # font, fgcolor, bgcolor, maxwinht
+        dockLineDefs = QDockWidget("Definitions")
+        dockLineDefs.setWidget(LineDefs)
+        LineDefs.setMinimumWidth(250) # sets the whole right side
+        LineDefs.timeline = subsList.timeline
+        LineDefs.statusbar = statusbar
+        subsList.lineDefs = LineDefs
 
 # Lookup Line (Minireader)
-    lookupLine = MiniReader(dockKanji, dockVocab, dockVocab.textVocabDefs, dockKanji.textKanjiDefs, LineDefs, Settings) # font, fgcolor, bgcolor, maxwinht
-    dockLookupLine = QDockWidget("Transcript Line Lookup")
-    dockLookupLine.setWidget(lookupLine)
-    dockLookupLine.setMaximumHeight(90)
-    w.addDockWidget(QtCore.Qt.RightDockWidgetArea, dockLookupLine)
-    w.addDockWidget(QtCore.Qt.RightDockWidgetArea, dockLineDefs)
+    with startup.phase('MiniReader'):
+        lookupLine = MiniReader(dockKanji, dockVocab, dockVocab.textVocabDefs, dockKanji.textKanjiDefs, LineDefs, Settings) # font, fgcolor, bgcolor, maxwinht
+        dockLookupLine = QDockWidget("Transcript Line Lookup")
+        dockLookupLine.setWidget(lookupLine)
+        dockLookupLine.setMaximumHeight(90)
+        w.addDockWidget(QtCore.Qt.RightDockWidgetArea, dockLookupLine)
+        subsList.lookupLine = lookupLine
+        dockVocab.lookupLine = lookupLine
+        w.addDockWidget(QtCore.Qt.RightDockWidgetArea, dockLineDefs)
+
+# Lookup Timings
+    if "--instrument" in sys.argv:
+        instrument.enabled = True
+    if instrument.enabled:
+        dockInstrument = cDockInstrument()
+        w.addDockWidget(QtCore.Qt.RightDockWidgetArea, dockInstrument)
 
 # Directory Select
-    dockDirSelect = cDockDirSelect(Session)
-    dockDirSelect.setMaximumHeight(70)
-    #dockDirSelect.setSizePolicy(QSizePolicy.Preferred, QSizePolicy.Preferred)
-    w.addDockWidget(QtCore.Qt.TopDockWidgetArea, dockDirSelect)
+    with startup.phase('cDockDirSelect'):
+        dockDirSelect = cDockDirSelect(Session, qp, subsList, LineDefs, dockSettings, statusbar)
+        dockDirSelect.setMaximumHeight(70)
+        #dockDirSelect.setSizePolicy(QSizePolicy.Preferred, QSizePolicy.Preferred)
+        w.addDockWidget(QtCore.Qt.TopDockWidgetArea, dockDirSelect)
+        LineDefs.dirSelect = dockDirSelect
+        Session.dirSelect = dockDirSelect
+        Session.settings = Settings
+        Session.lineDefs = LineDefs
 
 # Settings
     Settings.transcriptlist = subsList
@@ -1014,8 +1148,11 @@ if __name__ == "__main__":
     Settings.vocabdock = dockVocab
     Settings.linedefsdock = dockLineDefs
     Settings.statusbar = statusbar
-    Settings.loadtheme()
+    with startup.phase('loadtheme'):
+        Settings.loadtheme()
     #statusbar.showMessage("Translation Player Started . . .")
 
-    w.showMaximized()
+    with startup.phase('showMaximized'):
+        w.showMaximized()
+    QtCore.QTimer.singleShot(0, shown)
     qapp.exec_()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2015  Christian Lott
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import collections
+import json
+import multiprocessing
+import optparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from common import JAPANESE_DIR
+from yomi_base.core import cues
+from yomi_base.japanese import deinflect, dictionary, translate
+
+
+translator = None
+
+
+def openDictionary(dictPath, attachPaths, readonly=False):
+    database = dictionary.Dictionary(dictPath, readonly=readonly)
+    for filename in attachPaths:
+        database.attach(filename)
+    return database
+
+
+def initWorker(dictPath, attachPaths, deinflectPath):
+    # each worker process holds its own read-only connection
+    global translator
+    translator = translate.Translator(
+        deinflect.Deinflector(deinflectPath),
+        openDictionary(dictPath, attachPaths, readonly=True)
+    )
+
+
+def annotateChunk(task):
+    filename, offset, chunk = task
+
+    lines = list()
+    for i, (start, end, text) in enumerate(chunk):
+        tokens = list()
+        for position, length, id in translator.segment(text):
+            tokens.append({'start': position, 'length': length, 'text': text[position:position + length], 'id': id})
+
+        record = {'file': filename, 'cue': offset + i, 'start': start, 'end': end, 'text': text, 'tokens': tokens}
+        lines.append(json.dumps(record, ensure_ascii=False).encode('utf-8'))
+
+    return lines
+
+
+def writeLines(output, lines):
+    for line in lines:
+        output.write(line)
+        output.write('\n')
+    output.flush()
+    return len(lines)
+
+
+def main():
+    parser = optparse.OptionParser(usage='%prog [options] transcript [transcript ...]')
+    parser.add_option('--dictionary', dest='dictionary', default=os.path.join(JAPANESE_DIR, 'dictionary.db'), help='dictionary database')
+    parser.add_option('--attach', dest='attach', action='append', default=list(), metavar='DATABASE', help='search another dictionary after the first (repeatable)')
+    parser.add_option('--deinflect', dest='deinflect', default=os.path.join(JAPANESE_DIR, 'deinflect.json'), help='deinflection rules')
+    parser.add_option('--output', dest='output', help='JSON Lines output (default: stdout)')
+    parser.add_option('--jobs', dest='jobs', type='int', default=multiprocessing.cpu_count(), help='worker processes')
+    parser.add_option('--chunk', dest='chunk', type='int', default=64, help='cues per task')
+
+    options, args = parser.parse_args()
+    if len(args) == 0:
+        parser.print_help()
+        return
+
+    # workers cannot build indices on their read-only connections
+    openDictionary(options.dictionary, options.attach).requireIndices()
+
+    output = sys.stdout if options.output is None else open(options.output, 'w')
+    pool = multiprocessing.Pool(options.jobs, initWorker, (options.dictionary, options.attach, options.deinflect))
+
+    count = 0
+    timeStart = timeit.default_timer()
+    try:
+        # results are written in file and cue order as soon as they are ready;
+        # the pending queue bounds how far loading runs ahead of writing
+        pending = collections.deque()
+        for filename in args:
+            transcript = cues.loadCues(filename)
+            for offset in xrange(0, len(transcript), options.chunk):
+                task = filename, offset, transcript[offset:offset + options.chunk]
+                pending.append(pool.apply_async(annotateChunk, (task,)))
+                while len(pending) > options.jobs * 4:
+                    count += writeLines(output, pending.popleft().get())
+
+        while pending:
+            count += writeLines(output, pending.popleft().get())
+    finally:
+        pool.terminate()
+        pool.join()
+        if output is not sys.stdout:
+            output.close()
+
+    elapsed = timeit.default_timer() - timeStart
+    sys.stderr.write('{0} cues in {1:.2f} s ({2:.1f} cues/s, {3} jobs)\n'.format(count, elapsed, count / max(elapsed, 1e-6), options.jobs))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,369 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2015  Christian Lott
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import codecs
+import itertools
+import json
+import optparse
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import compile as compiler
+from common import THEME
+from yomi_base import reader_util
+from yomi_base.core import cues, rendering
+from yomi_base.core.sentence import SentenceIndex
+from yomi_base.japanese import deinflect, dictionary, translate, util
+
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+DEINFLECT_PATH = os.path.join(ROOT_DIR, 'yomi_base', 'japanese', 'deinflect.json')
+
+SYNTHETIC_KANA = u'あいうえおかきくけこさしすせそたちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわん'
+SYNTHETIC_ENDINGS = [u'', u'', u'る', u'う', u'く', u'す', u'い', u'む', u'つ']
+SYNTHETIC_TAGS = ['n', 'n', 'v1', 'v5r', 'v5k', 'adj-i', 'adj-na', 'vs', 'adv']
+
+
+def sampleVocabDefs(count):
+    results = list()
+    for i in xrange(count):
+        rules = [u'past', u'polite'] if i % 3 == 0 else list()
+        result = dictionary.Term(i + 1, u'食べる{0}'.format(i), u'たべる',
+            u'(v1,vt) (1) to eat; (2) to live on (e.g. a salary); to live off; to subsist on (P)', u'P v1 vt', 0, rules=rules)
+        result.source = u'食べました'
+        results.append(result)
+
+    return results
+
+
+def legacyVocabDef(definition, index):
+    # the docks' buildVocabDef from before the Renderer, without the Anki query
+    reading = unicode()
+    if definition['reading']:
+        reading = u'<span class = "reading">[{0}]<br/></span>'.format(definition['reading'])
+
+    rules = unicode()
+    if len(definition['rules']) > 0:
+        rules = ' &lt; '.join(definition['rules'])
+        rules = '<span class = "rules">({0})<br/></span>'.format(rules)
+
+    links = '<a href = "copyVocabDef:{0}"><img src = "img/icon_add_expression.png" align = "right"/></a>'.format(index)
+
+    html = u"""
+            <span class = "links">{0}</span>
+            <span class = "expression">{1}<br/></span>
+            {2}
+            <span class = "glossary">{3}<br/></span>
+            {4}
+            <br clear = "all"/>""".format(links, definition['expression'], reading, definition['glossary'], rules)
+    return html
+
+
+def legacyVocabDefs(definitions):
+    # the per-render header + string concatenation the docks used before the Renderer,
+    # over the dicts the lookup engine returned then
+    html = u"""
+                <html><head><style>
+                body {{ background-color: {0} }}
+                span.expression {{ font-size: {1}px; font-family: '{2}'; color: {3}; line-height: {10}px }}
+                span.reading {{ font-size: {4}px; font-family: '{5}'; color: {6}; line-height: {11}px }}
+                span.glossary {{ font-size: {7}px; font-family: '{8}'; color: {9}; line-height: {12}px }}
+                </style></head><body>""".format(THEME['bg'], THEME['efs'], THEME['eft'], THEME['efg'], THEME['rfs'], THEME['rft'],
+                                                THEME['rfg'], THEME['gfs'], THEME['gft'], THEME['gfg'], THEME['elh'], THEME['rlh'], THEME['glh'])
+    for i, definition in enumerate(definitions):
+        html += legacyVocabDef(definition, i)
+
+    return html + '</body></html>'
+
+
+#
+# Fixture
+#
+
+def syntheticEdict(kanji, count, seed):
+    # dictionary-shaped filler so lookups run against a realistically sized Terms
+    # table; built from the fixture kanji, so entries share prefixes with real words
+    rng = random.Random(seed)
+    for i in xrange(count):
+        expression = u''.join(rng.choice(kanji) for _ in xrange(rng.randint(1, 3))) + rng.choice(SYNTHETIC_ENDINGS)
+        reading = u''.join(rng.choice(SYNTHETIC_KANA) for _ in xrange(rng.randint(2, 6)))
+        yield u'{0} [{1}] /({2}) synthetic entry {3}/\n'.format(expression, reading, rng.choice(SYNTHETIC_TAGS), i)
+
+
+class Fixture:
+    # dictionary compiled with util/compile.py from the bundled excerpts plus
+    # `scale` synthetic entries, and the subtitle corpus
+    def __init__(self, scale, seed):
+        self.directory = tempfile.mkdtemp(prefix='tp-benchmark-')
+
+        kanjidic = os.path.join(FIXTURES_DIR, 'kanjidic')
+        kradfile = os.path.join(FIXTURES_DIR, 'kradfile')
+        edict = os.path.join(FIXTURES_DIR, 'edict')
+        self.path = os.path.join(self.directory, 'dictionary.db')
+
+        # compile.py reports progress on stdout, which may be carrying the JSON
+        stdout = sys.stdout
+        sys.stdout = sys.stderr
+        try:
+            if scale > 0:
+                kanji = [line[0] for line in compiler.loadDefinitions(kanjidic)]
+                with codecs.open(edict, encoding='euc-jp') as fp:
+                    lines = fp.readlines()
+                edict = os.path.join(self.directory, 'edict')
+                with codecs.open(edict, 'w', encoding='euc-jp') as fp:
+                    fp.writelines(lines)
+                    fp.writelines(list(syntheticEdict(kanji, scale, seed)))
+
+            compiler.build(self.path, kanjidic, kradfile, edict)
+        finally:
+            sys.stdout = stdout
+
+        self.dictionary = dictionary.Dictionary(self.path)
+        self.dictionary.requireIndices()
+        self.deinflector = deinflect.Deinflector(DEINFLECT_PATH)
+        self.translator = translate.Translator(self.deinflector, self.dictionary)
+        self.corpus = [text for start, end, text in cues.loadCues(os.path.join(FIXTURES_DIR, 'corpus.srt'))]
+
+
+    def close(self):
+        self.dictionary.db.close()
+        shutil.rmtree(self.directory)
+
+
+    def samples(self, length):
+        # the text under the cursor at every position of every cue, as a hover sees it
+        return [line[i:i + length] for line in self.corpus for i in xrange(len(line)) if util.isJapanese(line[i])]
+
+
+    def terms(self, length):
+        # every prefix findTerm tries at every position: the mix of hits and misses it queries
+        terms = list()
+        for sample in self.samples(length):
+            sample = util.sanitize(sample)
+            terms.extend(sample[:i] for i in xrange(len(sample), 0, -1))
+        return terms
+
+
+    def tagIndex(self):
+        tags = dict()
+        for expression, reading, tagList in self.dictionary.db.execute('SELECT expression, reading, tags FROM Terms'):
+            tags.setdefault(expression, list()).append(tagList.split())
+            if reading:
+                tags.setdefault(reading, list()).append(tagList.split())
+        return tags
+
+
+fixture = None
+
+
+def getFixture(options):
+    global fixture
+    if fixture is None:
+        fixture = Fixture(options.scale, options.seed)
+    return fixture
+
+
+#
+# Benchmarks (ms per call)
+#
+
+def timeCall(func, number):
+    return min(timeit.repeat(func, number=number, repeat=3)) / number * 1000.0
+
+
+def timeBatch(func, calls, passes):
+    # func makes `calls` calls; best of `passes` runs
+    return min(timeit.repeat(func, number=1, repeat=passes)) / max(calls, 1) * 1000.0
+
+
+def benchRender(options):
+    number = options.number
+    results = dict()
+    for count in [20, 100]:
+        definitions = sampleVocabDefs(count)
+        legacyDefinitions = [dict((name, getattr(definition, name)) for name in ('expression', 'reading', 'glossary', 'rules')) for definition in definitions]
+
+        def cold():
+            renderer = rendering.Renderer(rendering.VOCAB_STYLE)
+            renderer.setTheme(**THEME)
+            renderer.vocabDefs(definitions, None)
+
+        warm = rendering.Renderer(rendering.VOCAB_STYLE)
+        warm.setTheme(**THEME)
+
+        results['render.legacy.{0}'.format(count)] = timeCall(lambda: legacyVocabDefs(legacyDefinitions), number)
+        results['render.cold.{0}'.format(count)] = timeCall(cold, number)
+        results['render.cached.{0}'.format(count)] = timeCall(lambda: warm.vocabDefs(definitions, None), number)
+
+        # consecutive lookups, which mostly share entries at other positions
+        shifted = itertools.cycle([definitions, definitions[1:]])
+        results['render.shifted.{0}'.format(count)] = timeCall(lambda: warm.vocabDefs(next(shifted), None), number)
+
+    return results
+
+
+def benchDeinflect(options):
+    fixture = getFixture(options)
+    terms = fixture.terms(10)
+
+    # validated against an in-memory tag index so no SQL is timed
+    tags = fixture.tagIndex()
+    validator = lambda term: tags.get(term, list())
+
+    def run():
+        for term in terms:
+            fixture.deinflector.deinflect(term, validator)
+
+    return {'deinflect.term': timeBatch(run, len(terms), options.passes)}
+
+
+def benchDictionary(options):
+    fixture = getFixture(options)
+    terms = fixture.terms(10)
+    characters = [c for line in fixture.corpus for c in line if util.isKanji(c)]
+
+    def runTerms():
+        for term in terms:
+            fixture.dictionary.findTerm(term)
+
+    def runCharacters():
+        for c in characters:
+            fixture.dictionary.findCharacter(c)
+
+    return {
+        'dictionary.findTerm': timeBatch(runTerms, len(terms), options.passes),
+        'dictionary.findCharacter': timeBatch(runCharacters, len(characters), options.passes)
+    }
+
+
+def benchTranslator(options):
+    fixture = getFixture(options)
+    samples = fixture.samples(20)
+
+    def runTerms():
+        for sample in samples:
+            fixture.translator.findTerm(sample)
+
+    def runCharacters():
+        for line in fixture.corpus:
+            fixture.translator.findCharacters(line)
+
+    return {
+        'translator.findTerm': timeBatch(runTerms, len(samples), options.passes),
+        'translator.findCharacters': timeBatch(runCharacters, len(fixture.corpus), options.passes)
+    }
+
+
+def benchSentence(options):
+    fixture = getFixture(options)
+    document = u'\n'.join(fixture.corpus)
+    calls = sum(len(line) for line in fixture.corpus)
+
+    def runLines():
+        # a new index per line, as the lookup line changes
+        for line in fixture.corpus:
+            for position in xrange(len(line)):
+                reader_util.findSentence(line, position)
+
+    def runDocument():
+        for position in xrange(len(document)):
+            reader_util.findSentence(document, position)
+
+    return {
+        'sentence.line': timeBatch(runLines, calls, options.passes),
+        'sentence.document': timeBatch(runDocument, len(document), options.passes),
+        'sentence.index': timeCall(lambda: SentenceIndex(document), options.number)
+    }
+
+
+BENCHMARKS = [
+    ('render', benchRender),
+    ('deinflect', benchDeinflect),
+    ('dictionary', benchDictionary),
+    ('translator', benchTranslator),
+    ('sentence', benchSentence),
+]
+
+
+def gitCommit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT_DIR, stderr=subprocess.STDOUT).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = optparse.OptionParser(usage='%prog [options] [benchmark ...]')
+    parser.add_option('--number', dest='number', type='int', default=200, help='calls per timing')
+    parser.add_option('--passes', dest='passes', type='int', default=3, help='runs over the corpus per timing (best is kept)')
+    parser.add_option('--scale', dest='scale', type='int', default=20000, help='synthetic entries added to the fixture dictionary')
+    parser.add_option('--seed', dest='seed', type='int', default=1, help='synthetic dictionary seed')
+    parser.add_option('--json', dest='json', metavar='FILE', help='write results as JSON (- for stdout)')
+    parser.add_option('--compare', dest='compare', metavar='FILE', help='JSON results of an earlier run to compare against')
+
+    options, args = parser.parse_args()
+
+    results = dict()
+    try:
+        for name, bench in BENCHMARKS:
+            if args and name not in args:
+                continue
+            results.update(bench(options))
+    finally:
+        if fixture is not None:
+            fixture.close()
+
+    baseline = dict()
+    if options.compare:
+        with open(options.compare) as fp:
+            baseline = json.load(fp)['results']
+
+    if options.json:
+        report = {
+            'commit': gitCommit(),
+            'python': platform.python_version(),
+            'sqlite': dictionary.sqlite3.sqlite_version,
+            'options': {'number': options.number, 'passes': options.passes, 'scale': options.scale, 'seed': options.seed},
+            'results': results
+        }
+        if options.json == '-':
+            json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        else:
+            with open(options.json, 'w') as fp:
+                json.dump(report, fp, indent=2, sort_keys=True)
+
+    out = sys.stderr if options.json == '-' else sys.stdout
+    for key, value in sorted(results.items()):
+        if key in baseline:
+            out.write('{0:<32} {1:10.4f} ms {2:+7.1f}%\n'.format(key, value, (value / baseline[key] - 1.0) * 100.0))
+        else:
+            out.write('{0:<32} {1:10.4f} ms\n'.format(key, value))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2015  Christian Lott
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+
+
+# shared by the scripts in util/
+
+JAPANESE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'yomi_base', 'japanese')
+
+# a theme for rendering outside the player
+THEME = {
+    'bg': 'white',
+    'eft': 'Meiryo', 'efs': 16, 'efg': 'black', 'elh': 0,
+    'rft': 'Meiryo', 'rfs': 12, 'rfg': 'blue', 'rlh': 0,
+    'gft': 'Arial', 'gfs': 10, 'gfg': 'green', 'glh': 0,
+}
@@ -18,11 +18,28 @@
 
 
 import codecs
+import collections
+import gzip
+import json
+import multiprocessing
 import optparse
 import os
 import re
+import shutil
 import sqlite3
 import sys
+import time
+import timeit
+import zlib
+
+try:
+    import xml.etree.cElementTree as ElementTree
+except ImportError:
+    import xml.etree.ElementTree as ElementTree
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from yomi_base.japanese.util import COMMON_PRIORITIES, normalize, rank
 
 
 PARSED_TAGS = {
@@ -87,6 +104,39 @@ PARSED_TAGS = {
 }
 
 
+READING_PATTERN = re.compile('\[([^\]]+)\]')
+SENSE_PATTERN = re.compile('\(\d+\)\s*')
+TAGS_PATTERN = re.compile('\(([^\)\]]+)\)')
+KANJI_GLOSSARY_PATTERN = re.compile('\{([^\}]+)\}')
+
+ENTITY_PATTERN = re.compile('<!ENTITY\s+(\S+)\s+"([^"]*)"\s*>')
+XML_LANG = '{http://www.w3.org/XML/1998/namespace}lang'
+
+CHUNK_LINES = 5000
+GLOSSARY_BLOCK = 16 # rows per compressed glossary block
+INFLECTION_DEPTH = 2 # rules chained onto a dictionary form; 3 multiplies the table by about 6
+
+DEINFLECT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'yomi_base', 'japanese', 'deinflect.json')
+
+KANJI_COLUMNS = [('character', 'TEXT'), ('kunyomi', 'TEXT'), ('onyomi', 'TEXT'), ('glossary', 'TEXT')]
+KANJIDIC2_COLUMNS = KANJI_COLUMNS + [('grade', 'INTEGER'), ('strokes', 'INTEGER'), ('freq', 'INTEGER'), ('jlpt', 'INTEGER')]
+RADICALS_COLUMNS = [('character', 'TEXT'), ('radicals', 'TEXT')]
+# expnorm and readnorm are the hiragana-folded forms Dictionary looks words up by,
+# rank orders its results (lower first)
+EDICT_COLUMNS = [('expression', 'TEXT'), ('reading', 'TEXT'), ('glossary', 'TEXT'), ('tags', 'TEXT'), ('expnorm', 'TEXT'), ('readnorm', 'TEXT'), ('rank', 'INTEGER')]
+
+# the EDICT columns Dictionary reads, then the entry sequence number and the full
+# tag data EDICT cannot carry, space separated
+JMDICT_COLUMNS = EDICT_COLUMNS + [('seq', 'INTEGER'), ('priority', 'TEXT'), ('pos', 'TEXT'), ('misc', 'TEXT'), ('field', 'TEXT')]
+
+# the words whose lookups a changed row affects, logged in Changelog
+CHANGELOG_WORDS = {
+    'Terms': ('expression', 'reading'),
+    'Kanji': ('character', 'NULL'),
+    'Radicals': ('character', 'NULL'),
+}
+
+
 def isHiragana(c):
     return 0x3040 <= ord(c) < 0x30a0
 
@@ -96,94 +146,614 @@ def isKatakana(c):
 
 
 def loadDefinitions(path):
+    # lines are read one at a time, parsers and writers below are generators too,
+    # so a full EDICT2 is never held in memory
     print 'Parsing "{0}"...'.format(path)
     with codecs.open(path, encoding='euc-jp') as fp:
-        return filter(lambda x: x and x[0] != '#', fp.read().splitlines())
+        for line in fp:
+            line = line.splitlines()[0] # same line breaks as unicode.splitlines
+            if line and line[0] != '#':
+                yield line
 
 
-def parseKanjiDic(path):
-    results = list()
+def reportProgress(rows, table, every=100000):
+    start = timeit.default_timer()
+    count = 0
+    for row in rows:
+        yield row
+        count += 1
+        if count % every == 0:
+            print '  {0}: {1} rows ({2:.0f} rows/s)'.format(table, count, count / max(timeit.default_timer() - start, 1e-6))
 
+    elapsed = timeit.default_timer() - start
+    print '  {0}: {1} rows in {2:.1f} s ({3:.0f} rows/s)'.format(table, count, elapsed, count / max(elapsed, 1e-6))
+
+
+def parseKanjiDic(path):
     for line in loadDefinitions(path):
         segments = line.split()
         character = segments[0]
         kunyomi = ', '.join(filter(lambda x: filter(isHiragana, x), segments[1:]))
         onyomi = ', '.join(filter(lambda x: filter(isKatakana, x), segments[1:]))
-        glossary = '; '.join(re.findall('\{([^\}]+)\}', line))
-        results.append((character, kunyomi, onyomi, glossary))
-
-    return results
+        glossary = '; '.join(KANJI_GLOSSARY_PATTERN.findall(line))
+        yield character, kunyomi, onyomi, glossary
 
 
-def writeKanjiDic(cursor, values):
-    cursor.execute('DROP TABLE IF EXISTS Kanji')
-    cursor.execute('CREATE TABLE Kanji(character TEXT, kunyomi TEXT, onyomi TEXT, glossary TEXT)')
-    cursor.executemany('INSERT INTO Kanji VALUES(?, ?, ?, ?)', values)
+def writeKanjiDic(cursor, values, version, update=False):
+    writeTable(cursor, 'Kanji', KANJI_COLUMNS, ['character'], values, version, update)
 
 
 def parseKradFile(path):
-    results = list()
-
     for line in loadDefinitions(path):
         segments = line.split(' ')
         character = segments[0]
         radicals = ' '.join(segments[2:])
-        results.append((character, radicals))
+        yield character, radicals
 
-    return results
 
+def writeKradFile(cursor, values, version, update=False):
+    writeTable(cursor, 'Radicals', RADICALS_COLUMNS, ['character'], values, version, update)
 
-def writeKradFile(cursor, values):
-    cursor.execute('DROP TABLE IF EXISTS Radicals')
-    cursor.execute('CREATE TABLE Radicals(character TEXT, radicals TEXT)')
-    cursor.executemany('INSERT INTO Radicals VALUES(?, ?)', values)
 
+def parseEdictLine(line):
+    segments = line.split('/')
 
-def parseEdict(path):
-    results = list()
+    expression = segments[0].split(' ')
+    term = expression[0]
+    match = READING_PATTERN.search(expression[1])
+    reading = None if match is None else match.group(1)
 
-    for line in loadDefinitions(path):
-        segments = line.split('/')
+    glossary = filter(lambda x: len(x) > 0, segments[1:])
+    glossary = '; '.join(glossary)
+    glossary = SENSE_PATTERN.sub(str(), glossary)
+
+    tags = list()
+    for group in TAGS_PATTERN.findall(glossary):
+        tags.extend(group.split(','))
+
+    tags = set(tags).intersection(PARSED_TAGS)
+    tags = ' '.join(sorted(tags))
+
+    return term, reading, glossary, tags
+
+
+frequencies = dict() # the frequency list in a pool worker, see initEdictWorker
+
+
+def initEdictWorker(workerFrequencies):
+    global frequencies
+    frequencies = workerFrequencies
+
+
+def parseEdictChunk(lines):
+    return list(deriveTerms(map(parseEdictLine, lines), frequencies))
+
+
+def chunkLines(lines, size):
+    chunk = list()
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) == size:
+            yield chunk
+            chunk = list()
+
+    if chunk:
+        yield chunk
 
-        expression = segments[0].split(' ')
-        term = expression[0]
-        match = re.search('\[([^\]]+)\]', expression[1])
-        reading = None if match is None else match.group(1)
 
-        glossary = filter(lambda x: len(x) > 0, segments[1:])
-        glossary = '; '.join(glossary)
-        glossary = re.sub('\(\d+\)\s*', str(), glossary)
+def parseParallel(lines, parseChunk, jobs, initializer=None, initargs=()):
+    # chunks of lines are parsed in a pool and their rows yielded in input order;
+    # at most a few chunks per worker are in flight, so memory stays bounded
+    pool = multiprocessing.Pool(jobs, initializer, initargs)
+    try:
+        pending = collections.deque()
+        for chunk in chunkLines(lines, CHUNK_LINES):
+            pending.append(pool.apply_async(parseChunk, (chunk,)))
+            while len(pending) > jobs * 2:
+                for row in pending.popleft().get():
+                    yield row
 
-        tags = list()
-        for group in re.findall('\(([^\)\]]+)\)', glossary):
-            tags.extend(group.split(','))
+        while pending:
+            for row in pending.popleft().get():
+                yield row
+    finally:
+        pool.terminate()
+        pool.join()
 
-        tags = set(tags).intersection(PARSED_TAGS)
-        tags = ' '.join(sorted(tags))
 
-        results.append((term, reading, glossary, tags))
+def parseEdict(path, frequencies, jobs=1):
+    # rows with their lookup columns derived, see deriveTerms
+    if jobs > 1:
+        return parseParallel(loadDefinitions(path), parseEdictChunk, jobs, initEdictWorker, (frequencies,))
+
+    return deriveTerms((parseEdictLine(line) for line in loadDefinitions(path)), frequencies)
+
+
+def loadFrequencies(path):
+    # one word per line, most frequent first; anything after it on the line is ignored
+    print 'Parsing "{0}"...'.format(path)
+    positions = dict()
+    with codecs.open(path, encoding='utf-8-sig') as fp:
+        for line in fp:
+            segments = line.split()
+            if segments and segments[0][0] != '#':
+                positions.setdefault(segments[0], len(positions) + 1)
+
+    return positions
+
+
+def deriveTerms(values, frequencies):
+    # the lookup columns computed from a parsed EDICT or JMdict row: normalized
+    # expression and reading, and a rank from the (P) tag or JMdict priority codes
+    # and the frequency list
+    for row in values:
+        priorities = row[3].split() + (row[5].split() if len(row) > 4 else list())
+        position = frequencies.get(row[0])
+        yield row[:4] + (normalize(row[0]), normalize(row[1]), rank(priorities, position)) + row[4:]
+
+
+def writeEdict(cursor, values, version, update=False):
+    # EDICT has no entry numbers, so a changed line is a delete and an insert
+    writeTable(cursor, 'Terms', EDICT_COLUMNS, [name for name, type in EDICT_COLUMNS], values, version, update)
+
+
+def openSource(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def loadEntities(path):
+    # JMdict writes its tags as DTD entities (<pos>&v1;</pos>) which the parser
+    # expands to their descriptions; map those back to the names EDICT uses
+    entities = dict()
+    with openSource(path) as fp:
+        for line in fp:
+            for name, description in ENTITY_PATTERN.findall(line):
+                entities[description.decode('utf-8')] = name
+            if line.startswith(']>'):
+                break
+
+    return entities
+
+
+def iterElements(path, tag):
+    # yields each complete <tag> element, then clears everything parsed so far,
+    # so memory stays flat however large the file is
+    print 'Parsing "{0}"...'.format(path)
+    with openSource(path) as fp:
+        context = ElementTree.iterparse(fp, events=('start', 'end'))
+        _, root = next(context)
+        for event, element in context:
+            if event == 'end' and element.tag == tag:
+                yield element
+                root.clear()
+
+
+def texts(element, tag):
+    return [unicode(child.text) for child in element.findall(tag)]
+
+
+def parseJmdictEntry(entry, entities):
+    def names(sense, tag):
+        return [entities.get(text, text) for text in texts(sense, tag)]
+
+    seq = int(entry.findtext('ent_seq'))
+
+    # a sense's part of speech applies to the following senses until one sets its own
+    glossary = list()
+    pos, misc, field = list(), list(), list()
+    lastPos = list()
+    for sense in entry.findall('sense'):
+        ownPos = names(sense, 'pos')
+        sensePos = ownPos or lastPos
+        senseMisc = names(sense, 'misc')
+        senseField = names(sense, 'field')
+        glosses = [unicode(gloss.text) for gloss in sense.findall('gloss') if gloss.get(XML_LANG, 'eng') == 'eng']
+        if not glosses:
+            continue
+
+        labels = list()
+        if ownPos or senseMisc:
+            labels.append(u'({0})'.format(','.join(ownPos + senseMisc)))
+        if senseField:
+            labels.append(u'{{{0}}}'.format(','.join(senseField)))
+        if labels:
+            glosses[0] = u' '.join(labels + [glosses[0]])
+
+        glossary.extend(glosses)
+        pos.extend(p for p in sensePos if p not in pos)
+        misc.extend(m for m in senseMisc if m not in misc)
+        field.extend(f for f in senseField if f not in field)
+        lastPos = sensePos
+
+    if not glossary:
+        return
+
+    def row(expression, reading, priority):
+        priority = sorted(set(priority), key=priority.index)
+        common = COMMON_PRIORITIES.intersection(priority)
+        tags = PARSED_TAGS.intersection(pos + misc + (['P'] if common else []))
+        text = u'; '.join(glossary + ([u'(P)'] if common else []))
+        return expression, reading, text, ' '.join(sorted(tags)), seq, ' '.join(priority), ' '.join(pos), ' '.join(misc), ' '.join(field)
+
+    # one row per written form and each reading that applies to it, as EDICT2 lists
+    # them; readings that never take the kanji are rows of their own, like kana words
+    readings = list()
+    for element in entry.findall('r_ele'):
+        nokanji = element.find('re_nokanji') is not None
+        readings.append((element.findtext('reb'), nokanji, texts(element, 're_restr'), texts(element, 're_pri')))
+
+    # a written form is common by its own ke_pri, as EDICT marks (P) on each kanji
+    # element; a reading's re_pri only counts for the forms re_restr ties it to
+    kanji = [(element.findtext('keb'), texts(element, 'ke_pri')) for element in entry.findall('k_ele')]
+    for keb, kanjiPriority in kanji:
+        for reb, nokanji, restrictions, readingPriority in readings:
+            if not nokanji and (not restrictions or keb in restrictions):
+                yield row(keb, reb, kanjiPriority + (readingPriority if restrictions else list()))
+
+    for reb, nokanji, restrictions, readingPriority in readings:
+        if nokanji or not kanji:
+            yield row(reb, None, readingPriority)
+
+
+def parseJmdict(path):
+    entities = loadEntities(path)
+    for entry in iterElements(path, 'entry'):
+        for row in parseJmdictEntry(entry, entities):
+            yield row
+
+
+def writeJmdict(cursor, values, version, update=False):
+    writeTable(cursor, 'Terms', JMDICT_COLUMNS, ['seq', 'expression', 'reading'], values, version, update)
+
+
+def parseKanjiDic2(path):
+    for element in iterElements(path, 'character'):
+        character = element.findtext('literal')
+        readings = element.findall('reading_meaning/rmgroup/reading')
+        kunyomi = ', '.join(unicode(r.text) for r in readings if r.get('r_type') == 'ja_kun')
+        onyomi = ', '.join(unicode(r.text) for r in readings if r.get('r_type') == 'ja_on')
+        meanings = element.findall('reading_meaning/rmgroup/meaning')
+        glossary = '; '.join(unicode(m.text) for m in meanings if m.get('m_lang', 'en') == 'en')
+
+        def number(path):
+            text = element.findtext(path)
+            return None if text is None else int(text)
+
+        yield character, kunyomi, onyomi, glossary, number('misc/grade'), number('misc/stroke_count'), number('misc/freq'), number('misc/jlpt')
+
+
+def writeKanjiDic2(cursor, values, version, update=False):
+    writeTable(cursor, 'Kanji', KANJIDIC2_COLUMNS, ['character'], values, version, update)
+
+
+def packGlossaries(rows, size):
+    # blocks of the glossaries of `size` consecutive rowids, NUL separated (empty
+    # for rowids not in Terms) and compressed together; single glossaries are too
+    # short for zlib to find much to share
+    block, slots = None, None
+    for id, glossary in rows:
+        if id // size != block:
+            if slots is not None:
+                yield block, sqlite3.Binary(zlib.compress(u'\0'.join(slots).encode('utf-8'), 9))
+            block, slots = id // size, [u''] * size
+        slots[id % size] = glossary
+
+    if slots is not None:
+        yield block, sqlite3.Binary(zlib.compress(u'\0'.join(slots).encode('utf-8'), 9))
+
+
+def compressGlossaries(cursor, size=GLOSSARY_BLOCK):
+    # glossaries move to their own table, so the Terms rows lookups scan stay
+    # small; Dictionary decompresses them only for the results it returns
+    print '  Compressing glossaries...'
+    cursor.execute('DROP TABLE IF EXISTS Glossary')
+    cursor.execute('CREATE TABLE Glossary(block INTEGER PRIMARY KEY, glossaries BLOB)')
+    rows = cursor.connection.execute('SELECT rowid, glossary FROM Terms WHERE glossary IS NOT NULL ORDER BY rowid')
+    cursor.executemany('INSERT INTO Glossary VALUES(?, ?)', packGlossaries(rows, size))
+    cursor.execute('UPDATE Terms SET glossary=NULL')
+    cursor.execute('INSERT OR REPLACE INTO Meta VALUES(?, ?)', ('glossaryBlock', size))
+
+
+def expandGlossaries(cursor):
+    # puts compressed glossaries back into Terms, for an update to diff against;
+    # False when there were none
+    if not hasTable(cursor, 'Glossary'):
+        return False
+
+    print '  Expanding glossaries...'
+    size = int(cursor.execute('SELECT value FROM Meta WHERE name=?', ('glossaryBlock',)).fetchone()[0])
+    for block, glossaries in cursor.connection.execute('SELECT block, glossaries FROM Glossary'):
+        slots = zlib.decompress(glossaries).decode('utf-8').split(u'\0')
+        cursor.executemany('UPDATE Terms SET glossary=? WHERE rowid=?', ((glossary, block * size + i) for i, glossary in enumerate(slots)))
+    cursor.execute('DROP TABLE Glossary')
+    return True
+
+
+def loadInflectionRules(path):
+    # (rule, kanaIn, kanaOut, tagsIn, tagsOut) for every variant the deinflector
+    # can apply; it would drop the whole term for an empty kanaIn
+    with codecs.open(path, 'rb', 'utf-8') as fp:
+        rules = json.load(fp)
+
+    variants = list()
+    for rule, ruleVariants in sorted(rules.items()):
+        for variant in ruleVariants:
+            if variant['kanaIn']:
+                variants.append((rule, variant['kanaIn'], variant['kanaOut'], variant['tagsIn'], variant['tagsOut']))
+
+    return variants
+
+
+def searchTags(patterns, tags):
+    # Deinflection.searchTags: a node's tags are patterns searched for in the tags
+    # it is checked against; a node without tags accepts anything
+    if len(patterns) == 0:
+        return True
+
+    for pattern in patterns:
+        for tag in tags:
+            if re.search(pattern, tag):
+                return True
+
+    return False
+
+
+def inflect(form, tags, variants, depth):
+    # the surface forms Deinflector.deinflect traces back to form, a dictionary form
+    # with these tags, as (surface, rules) with the rules listed from the dictionary
+    # form outwards like deinflect does; breadth first, so each surface keeps its
+    # shortest chain
+    results = list()
+    seen = {form}
+    frontier = [(form, tags, list())]
+    for _ in xrange(depth):
+        following = list()
+        for term, accepted, rules in frontier:
+            for rule, kanaIn, kanaOut, tagsIn, tagsOut in variants:
+                if not term.endswith(kanaOut) or not searchTags(tagsOut, accepted):
+                    continue
+
+                surface = term[:len(term) - len(kanaOut)] + kanaIn
+                chain = rules + [rule]
+                if surface not in seen:
+                    seen.add(surface)
+                    results.append((surface, chain))
+                if tagsIn:
+                    following.append((surface, tagsIn, chain))
+
+        frontier = following
 
     return results
 
 
-def writeEdict(cursor, values):
-    cursor.execute('DROP TABLE IF EXISTS Terms')
-    cursor.execute('CREATE TABLE Terms(expression TEXT, reading TEXT, glossary TEXT, tags TEXT)')
-    cursor.executemany('INSERT INTO Terms VALUES(?, ?, ?, ?)', values)
+def parseInflections(cursor, variants, depth, chains):
+    # from the tags of the entries Terms already holds; only tags some rule produces
+    # can start a chain, which leaves verbs and adjectives. Rule chains repeat across
+    # entries, so rows refer to them by their number in chains
+    inflectable = set(tag for variant in variants for tag in variant[4])
+    rows = cursor.connection.execute('SELECT rowid, expnorm, readnorm, tags FROM Terms')
+    for id, expnorm, readnorm, tags in rows:
+        tags = tags.split()
+        if not any(searchTags([pattern], tags) for pattern in inflectable):
+            continue
+
+        forms = set()
+        for form in filter(None, [expnorm, readnorm]):
+            for surface, rules in inflect(form, tags, variants, depth):
+                if surface not in forms:
+                    forms.add(surface)
+                    yield surface, id, chains.setdefault(u'|'.join(rules), len(chains) + 1)
+
+
+def writeInflections(cursor, variants, depth=INFLECTION_DEPTH):
+    # derived from Terms, so rewritten in full after it changes
+    chains = dict()
+    cursor.execute('DROP TABLE IF EXISTS Inflections')
+    cursor.execute('DROP TABLE IF EXISTS InflectionRules')
+    cursor.execute('CREATE TABLE Inflections(form TEXT, id INTEGER, rules INTEGER)')
+    cursor.execute('CREATE TABLE InflectionRules(id INTEGER PRIMARY KEY, rules TEXT)')
+    cursor.executemany('INSERT INTO Inflections VALUES(?, ?, ?)', reportProgress(parseInflections(cursor, variants, depth, chains), 'Inflections'))
+    cursor.executemany('INSERT INTO InflectionRules VALUES(?, ?)', ((id, rules) for rules, id in chains.items()))
+
 
+def hasTable(cursor, table):
+    return cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,)).fetchone() is not None
 
-def build(path, kanjidic, kradfile, edict):
-    with sqlite3.connect(path) as db:
+
+def writeIndices(cursor, table, columns):
+    # same names as Dictionary.requireIndex, which then finds them already built
+    for column in columns:
+        print '  Indexing {0}({1})...'.format(table, column)
+        cursor.execute('CREATE INDEX IF NOT EXISTS index_{0}_{1} ON {0}({1})'.format(table, column))
+
+
+#
+# Versions and incremental updates
+#
+
+def beginVersion(cursor, update):
+    # every build bumps Meta.version; a full build starts a new Changelog since
+    # nothing logged before it still names the same rows
+    cursor.execute('CREATE TABLE IF NOT EXISTS Meta(name TEXT PRIMARY KEY, value)')
+    cursor.execute('CREATE TABLE IF NOT EXISTS Changelog(version INTEGER, tableName TEXT, id INTEGER, action TEXT, word TEXT, reading TEXT)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS index_Changelog_version ON Changelog(version)')
+
+    row = cursor.execute('SELECT value FROM Meta WHERE name=?', ('version',)).fetchone()
+    version = 1 if row is None else int(row[0]) + 1
+    cursor.execute('INSERT OR REPLACE INTO Meta VALUES(?, ?)', ('version', version))
+    cursor.execute('INSERT OR REPLACE INTO Meta VALUES(?, ?)', ('updated', time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())))
+
+    if not update:
+        cursor.execute('DELETE FROM Changelog')
+
+    return version
+
+
+def tableColumns(cursor, table):
+    return [(name, type) for _, name, type, _, _, _ in cursor.execute('PRAGMA table_info({0})'.format(table))]
+
+
+def writeTable(cursor, table, columns, key, values, version, update=False):
+    # an update applies only the differences when the table already has these
+    # columns; anything else (a first build, EDICT replaced by JMdict) is rewritten
+    if update and tableColumns(cursor, table) == columns:
+        updateTable(cursor, table, columns, key, values, version)
+        return
+
+    cursor.execute('DROP TABLE IF EXISTS {0}'.format(table))
+    cursor.execute('CREATE TABLE {0}({1})'.format(table, ', '.join(' '.join(column) for column in columns)))
+    cursor.executemany('INSERT INTO {0} VALUES({1})'.format(table, ', '.join('?' * len(columns))), reportProgress(values, table))
+    cursor.execute('INSERT INTO Changelog VALUES(?, ?, NULL, ?, NULL, NULL)', (version, table, 'rebuild'))
+
+
+def updateTable(cursor, table, columns, key, values, version):
+    names = [name for name, type in columns]
+    other = [name for name in names if name not in key]
+    match = ' AND '.join('t.{0} IS s.{0}'.format(name) for name in key)
+    differs = ' OR '.join('t.{0} IS NOT s.{0}'.format(name) for name in other)
+    word, reading = CHANGELOG_WORDS[table]
+
+    # the new source goes to a staging table and is diffed in SQL, so only changed
+    # rows are ever held in memory; unchanged and updated rows keep their ids
+    cursor.execute('DROP TABLE IF EXISTS temp.Staging')
+    cursor.execute('CREATE TEMP TABLE Staging({0})'.format(', '.join(' '.join(column) for column in columns)))
+    cursor.executemany('INSERT INTO Staging VALUES({0})'.format(', '.join('?' * len(columns))), reportProgress(values, table))
+    cursor.execute('CREATE INDEX temp.index_Staging_key ON Staging({0})'.format(', '.join(key)))
+    # dropped again below, so an update leaves the same schema as a full build
+    cursor.execute('CREATE INDEX index_{0}_update ON {0}({1})'.format(table, key[0]))
+
+    # inserts first, numbered after every existing row so none takes the id of a row
+    # deleted below, then updates and deletes among the rows that were there before
+    last = cursor.execute('SELECT IFNULL(MAX(rowid), 0) FROM {0}'.format(table)).fetchone()[0]
+    cursor.execute('INSERT INTO {0} SELECT * FROM Staging s WHERE NOT EXISTS (SELECT 1 FROM {0} t WHERE {1})'.format(table, match))
+
+    # a key both sides have (duplicate source lines) but not equally often gains or
+    # loses the difference, the last rows of the key going first
+    removed = list()
+    keyed = ' AND '.join('{0} IS ?'.format(name) for name in key)
+    duplicated = 'SELECT {1} FROM {0} GROUP BY {1} HAVING COUNT(*) > 1'.format('{0}', ', '.join(key))
+    for values in set(cursor.execute(duplicated.format('Staging')).fetchall() + cursor.execute(duplicated.format(table)).fetchall()):
+        staged = cursor.execute('SELECT COUNT(*) FROM Staging WHERE ' + keyed, values).fetchone()[0]
+        current = cursor.execute('SELECT COUNT(*) FROM {0} WHERE rowid <= ? AND {1}'.format(table, keyed), (last,) + values).fetchone()[0]
+        if current and staged > current:
+            cursor.execute('INSERT INTO {0} SELECT * FROM Staging WHERE {1} ORDER BY rowid DESC LIMIT ?'.format(table, keyed), values + (staged - current,))
+        elif staged and current > staged:
+            removed += cursor.execute('SELECT rowid FROM {0} WHERE rowid <= ? AND {1} ORDER BY rowid DESC LIMIT ?'.format(table, keyed), (last,) + values + (current - staged,)).fetchall()
+
+    cursor.execute('INSERT INTO Changelog SELECT ?, ?, rowid, ?, {1}, {2} FROM {0} WHERE rowid > ?'.format(table, word, reading), (version, table, 'insert', last))
+    inserted = cursor.rowcount
+
+    updates = list()
+    if other:
+        updates = cursor.execute('SELECT t.rowid, {1} FROM {0} t JOIN Staging s ON {2} WHERE t.rowid <= ? AND ({3})'.format(
+            table, ', '.join('s.' + name for name in other), match, differs), (last,)).fetchall()
+        cursor.executemany('UPDATE {0} SET {1} WHERE rowid=?'.format(table, ', '.join(name + '=?' for name in other)), [row[1:] + row[:1] for row in updates])
+        cursor.executemany('INSERT INTO Changelog SELECT ?, ?, rowid, ?, {1}, {2} FROM {0} WHERE rowid=?'.format(table, word, reading), [(version, table, 'update', row[0]) for row in updates])
+
+    missing = 'SELECT {{0}} FROM {0} t WHERE t.rowid <= ? AND NOT EXISTS (SELECT 1 FROM Staging s WHERE {1})'.format(table, match)
+    cursor.execute('INSERT INTO Changelog ' + missing.format('?, ?, t.rowid, ?, {0}, {1}'.format(word, reading)), (version, table, 'delete', last))
+    deleted = cursor.rowcount
+    cursor.execute('DELETE FROM {0} WHERE rowid IN ({1})'.format(table, missing.format('t.rowid')), (last,))
+    cursor.executemany('INSERT INTO Changelog SELECT ?, ?, rowid, ?, {1}, {2} FROM {0} WHERE rowid=?'.format(table, word, reading), [(version, table, 'delete', row[0]) for row in removed])
+    cursor.executemany('DELETE FROM {0} WHERE rowid=?'.format(table), removed)
+    deleted += len(removed)
+
+    cursor.execute('DROP INDEX index_{0}_update'.format(table))
+    cursor.execute('DROP TABLE temp.Staging')
+    print '  {0}: {1} inserted, {2} updated, {3} deleted'.format(table, inserted, len(updates), deleted)
+
+
+def build(path, kanjidic, kradfile, edict, jobs=1, jmdict=None, kanjidic2=None, update=False, frequency=None, compress=False, deinflect=None, depth=INFLECTION_DEPTH):
+    start = timeit.default_timer()
+
+    # everything in one explicit transaction (the sqlite3 module would otherwise
+    # commit before each DROP/CREATE). A full build is a bulk load with no rollback
+    # journal or fsyncs, so it writes a copy next to the database (keeping the tables
+    # it does not rebuild) that only replaces it once complete; a failed build
+    # deletes the copy. An update keeps the journal and writes in place, so a failed
+    # one leaves the previous version intact
+    target = path
+    if not update:
+        path = target + '.tmp'
+        if os.path.exists(path):
+            os.remove(path)
+        if os.path.exists(target):
+            shutil.copyfile(target, path)
+
+    db = sqlite3.connect(path, isolation_level=None)
+    complete = False
+    try:
         cursor = db.cursor()
+        if not update:
+            cursor.execute('PRAGMA journal_mode=OFF')
+            cursor.execute('PRAGMA synchronous=OFF')
+        cursor.execute('BEGIN')
+        version = beginVersion(cursor, update)
+        frequencies = dict() if frequency is None else loadFrequencies(frequency)
 
         if kanjidic is not None:
-            writeKanjiDic(cursor, parseKanjiDic(kanjidic))
+            writeKanjiDic(cursor, parseKanjiDic(kanjidic), version, update)
+            writeIndices(cursor, 'Kanji', ['character'])
 
-        if kradfile is not None:
-            writeKradFile(cursor, parseKradFile(kradfile))
+        if kanjidic2 is not None:
+            writeKanjiDic2(cursor, parseKanjiDic2(kanjidic2), version, update)
+            writeIndices(cursor, 'Kanji', ['character'])
 
-        if edict is not None:
-            writeEdict(cursor, parseEdict(edict))
+        if kradfile is not None:
+            writeKradFile(cursor, parseKradFile(kradfile), version, update)
+
+        compressed = False
+        if edict is not None or jmdict is not None:
+            # an update diffs against the full glossaries, and keeps them compressed if they were
+            wasCompressed = False
+            if update:
+                wasCompressed = expandGlossaries(cursor)
+            compressed = compress or wasCompressed
+            cursor.execute('DROP TABLE IF EXISTS Glossary')
+
+            if edict is not None:
+                writeEdict(cursor, parseEdict(edict, frequencies, jobs), version, update)
+            else:
+                writeJmdict(cursor, deriveTerms(parseJmdict(jmdict), frequencies), version, update)
+            writeIndices(cursor, 'Terms', ['expnorm', 'readnorm'])
+
+            # an update also keeps the inflections if there were any
+            if deinflect is not None or update and hasTable(cursor, 'Inflections'):
+                writeInflections(cursor, loadInflectionRules(deinflect or DEINFLECT_PATH), depth)
+                writeIndices(cursor, 'Inflections', ['form'])
+            else:
+                # inflections of an earlier build point at rowids the new Terms reuse
+                cursor.execute('DROP TABLE IF EXISTS Inflections')
+                cursor.execute('DROP TABLE IF EXISTS InflectionRules')
+
+            if compressed:
+                compressGlossaries(cursor)
+
+        cursor.execute('COMMIT')
+
+        if compressed:
+            # repack the Terms pages the glossaries were cleared from
+            print '  Vacuuming...'
+            cursor.execute('VACUUM')
+        complete = True
+    finally:
+        db.close()
+        if path != target:
+            if complete:
+                replaceFile(path, target)
+            else:
+                os.remove(path)
+
+    print '{0} "{1}" to version {2} in {3:.1f} s'.format('Updated' if update else 'Built', target, version, timeit.default_timer() - start)
+
+
+def replaceFile(source, target):
+    # os.rename does not replace an existing file on Windows
+    if os.name == 'nt' and os.path.exists(target):
+        os.remove(target)
+    os.rename(source, target)
 
 
 def main():
@@ -191,13 +761,26 @@ def main():
     parser.add_option('--kanjidic', dest='kanjidic')
     parser.add_option('--kradfile', dest='kradfile')
     parser.add_option('--edict', dest='edict')
+    parser.add_option('--jmdict', dest='jmdict', help='JMdict XML (may be gzipped), instead of --edict')
+    parser.add_option('--kanjidic2', dest='kanjidic2', help='KANJIDIC2 XML (may be gzipped), instead of --kanjidic')
+    parser.add_option('--frequency', dest='frequency', help='word frequency list ranking terms, one word per line, most frequent first')
+    parser.add_option('--compress-glossary', dest='compress', action='store_true', default=False, help='store glossaries zlib compressed in their own table')
+    parser.add_option('--inflections', dest='inflections', action='store_true', default=False, help='precompute the inflected forms of verbs and adjectives')
+    parser.add_option('--deinflect', dest='deinflect', default=DEINFLECT_PATH, help='deinflection rules the inflections are generated from')
+    parser.add_option('--inflection-depth', dest='depth', type='int', default=INFLECTION_DEPTH, help='rules chained onto each dictionary form')
+    parser.add_option('--update', dest='update', action='store_true', default=False, help='apply only the changes to an existing database')
+    parser.add_option('--jobs', dest='jobs', type='int', default=1, help='processes parsing EDICT (same Terms rows as 1)')
 
     options, args = parser.parse_args()
 
     if len(args) == 0:
         parser.print_help()
+    elif options.edict is not None and options.jmdict is not None:
+        parser.error('--edict and --jmdict both write the Terms table')
+    elif options.kanjidic is not None and options.kanjidic2 is not None:
+        parser.error('--kanjidic and --kanjidic2 both write the Kanji table')
     else:
-        build(args[0], options.kanjidic, options.kradfile, options.edict)
+        build(args[0], options.kanjidic, options.kradfile, options.edict, options.jobs, options.jmdict, options.kanjidic2, options.update, options.frequency, options.compress, options.deinflect if options.inflections else None, options.depth)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2015  Christian Lott
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import optparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from common import JAPANESE_DIR, THEME
+from yomi_base import instrument
+from yomi_base.core import cues, rendering
+from yomi_base.core.defstore import DefsStore
+from yomi_base.core.lookup import Lookup
+from yomi_base.core.timeline import Timeline
+from yomi_base.japanese import deinflect, dictionary, translate
+
+
+SAMPLE_LINES = [
+    u'今日は学校で日本語を勉強しました。',
+    u'「本当に？」と彼は聞いた。',
+    u'食べたくないなら、食べなくてもいいよ。',
+    u'明日の朝、駅で待っています。',
+]
+
+
+def syntheticCues(count):
+    # one cue every 3 s, 2.5 s long
+    return [(i * 3000, i * 3000 + 2500, SAMPLE_LINES[i % len(SAMPLE_LINES)]) for i in xrange(count)]
+
+
+def summary(name, samples):
+    if len(samples) == 0:
+        print '{0:<10} no samples'.format(name)
+        return
+
+    samples = sorted(samples)
+    total = sum(samples)
+    print '{0:<10} {1:7d} calls {2:10.1f} ms total {3:8.4f} ms mean {4:8.4f} ms p50 {5:8.4f} ms p95 {6:8.4f} ms max'.format(
+        name, len(samples), total, total / len(samples), samples[len(samples) / 2], samples[int(len(samples) * 0.95)], samples[-1])
+
+
+def timed(samples, func, *args):
+    start = timeit.default_timer()
+    result = func(*args)
+    samples.append((timeit.default_timer() - start) * 1000.0)
+    return result
+
+
+def fillStore(store, timeline, language, perLine):
+    # save the first few segmented words of every line, as a user adding definitions would
+    for row in xrange(len(timeline)):
+        for start, length, id in language.segment(timeline.text(row))[:perLine]:
+            results, _ = language.findTerm(timeline.text(row)[start:start + length])
+            if results:
+                store.add(row, results[0].expression, results[0].reading, results[0].glossary)
+
+
+def runTicks(timeline, store, renderer, interval):
+    # playback from the first to the last cue at the player's tick interval; every
+    # row change fetches and renders that line's saved definitions like cLineDefs
+    ticks = list()
+    changes = list()
+
+    def change(row):
+        html = [renderer.header]
+        for id, expression, reading, glossary in store.findLine(row):
+            html.append(renderer.lineDef(expression, reading, glossary, id))
+        html.append(rendering.FOOTER)
+        return u''.join(html)
+
+    timeline.seek(0)
+    end = timeline.cues[-1][1] if len(timeline) else 0
+    for t in xrange(0, end + interval, interval):
+        if timed(ticks, timeline.tick, t):
+            timed(changes, change, timeline.row)
+
+    return ticks, changes
+
+
+def runLookups(timeline, lookup, renderer, language, withSpans):
+    # hover every character of every line, rendering the vocabulary panel each time
+    finds = list()
+    renders = list()
+
+    for row in xrange(len(timeline)):
+        text = timeline.text(row)
+        lookup.setContent(text)
+        lookup.setSpans(language.segment(text) if withSpans else None)
+
+        for position in xrange(len(text)):
+            with instrument.stage('hover', root=True):
+                result = timed(finds, lookup.find, position)
+                if result is not None:
+                    with instrument.stage('html'):
+                        timed(renders, renderer.vocabDefs, result[2][:20], None)
+
+    return finds, renders
+
+
+def main():
+    parser = optparse.OptionParser(usage='%prog [options] [transcript]')
+    parser.add_option('--dictionary', dest='dictionary', default=os.path.join(JAPANESE_DIR, 'dictionary.db'), help='dictionary database')
+    parser.add_option('--attach', dest='attach', action='append', default=list(), metavar='DATABASE', help='search another dictionary after the first (repeatable)')
+    parser.add_option('--deinflect', dest='deinflect', default=os.path.join(JAPANESE_DIR, 'deinflect.json'), help='deinflection rules')
+    parser.add_option('--cues', dest='cues', type='int', default=200, help='synthetic cues when no transcript is given')
+    parser.add_option('--interval', dest='interval', type='int', default=500, help='tick interval in ms')
+    parser.add_option('--defs', dest='defs', type='int', default=3, help='saved definitions per line')
+    parser.add_option('--no-spans', dest='spans', action='store_false', default=True, help='look up without tokenized spans')
+    parser.add_option('--instrument', dest='instrument', metavar='CSV', help='record the per-stage lookup breakdown and export it')
+
+    options, args = parser.parse_args()
+    instrument.enabled = options.instrument is not None
+
+    database = dictionary.Dictionary(options.dictionary)
+    for filename in options.attach:
+        database.attach(filename)
+
+    language = translate.Translator(deinflect.Deinflector(options.deinflect), database)
+
+    timeline = Timeline(cues.loadCues(args[0]) if args else syntheticCues(options.cues))
+    store = DefsStore()
+    fillStore(store, timeline, language, options.defs)
+
+    lineRenderer = rendering.Renderer(rendering.LINE_STYLE)
+    lineRenderer.setTheme(**THEME)
+    vocabRenderer = rendering.Renderer(rendering.VOCAB_STYLE)
+    vocabRenderer.setTheme(**THEME)
+
+    ticks, changes = runTicks(timeline, store, lineRenderer, options.interval)
+    finds, renders = runLookups(timeline, Lookup(language), vocabRenderer, language, options.spans)
+
+    print '{0} cues'.format(len(timeline))
+    summary('tick', ticks)
+    summary('linedefs', changes)
+    summary('lookup', finds)
+    summary('vocab', renders)
+
+    if options.instrument:
+        for name, count, mean, p50, p95, p99 in instrument.report():
+            print '{0:<20} {1:7d} samples {2:8.4f} mean {3:8.4f} p50 {4:8.4f} p95 {5:8.4f} p99'.format(name, count, mean, p50, p95, p99)
+        instrument.exportCsv(options.instrument)
+
+
+if __name__ == '__main__':
+    main()
@@ -18,4 +18,10 @@
 
 c = {
     'appVersion': '0.13b',
+    'prefetchDepth': 3,        # transcript lines ahead whose Definitions panel is prepared during playback
+    'prefetchCacheSize': 32,   # prepared lines kept
+    'lookupInterval': 30,      # minimum ms between hover lookups in the lookup line
+    'slowHandler': 30,         # ms a slot or event handler may take before profiling logs it
+    'maxResults': 20,          # definitions shown in the vocabulary and kanji panels
+    'dictionaries': ['dictionary.db'], # in the japanese directory, by priority; missing extra ones are skipped
 }
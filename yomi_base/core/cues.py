@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2015  Christian Lott
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+
+
+#
+# Cues
+#
+
+def loadCuesSrt(filename):
+    import pysrt
+
+    return [(cue.start.ordinal, cue.end.ordinal, cue.text) for cue in pysrt.open(filename, encoding='utf-8')]
+
+
+def loadCuesAss(filename):
+    import ass
+
+    with open(filename, 'r') as f:
+        events = ass.parse(f).events
+
+    return [(int(event.start.total_seconds() * 1000), int(event.end.total_seconds() * 1000), event.text.decode('utf_8')) for event in events]
+
+
+def loadCues(filename):
+    # (start ms, end ms, text) for every cue of a transcript, without Qt
+    _, ext = os.path.splitext(filename)
+    if ext == '.srt':
+        return loadCuesSrt(filename)
+    if ext == '.ass':
+        return loadCuesAss(filename)
+
+    raise ValueError('unsupported transcript: {0}'.format(filename))
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2015  Christian Lott
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import pickle
+import sqlite3
+
+
+SQLITE_MAGIC = 'SQLite format 3\x00'
+
+
+#
+# DefsStore
+#
+
+class DefsStore:
+    # Saved definitions for one transcript, kept in a SQLite file (WAL journal)
+    # so every add, edit and delete is on disk as soon as it happens.
+    def __init__(self, filename=':memory:'):
+        self.filename = filename
+        if filename != ':memory:':
+            self.migrate()
+
+        self.db = sqlite3.connect(filename)
+        if filename != ':memory:':
+            self.db.execute('PRAGMA journal_mode=WAL')
+            self.db.execute('PRAGMA synchronous=NORMAL')
+
+        self.db.execute('CREATE TABLE IF NOT EXISTS Defs(id INTEGER PRIMARY KEY, line INTEGER, expression TEXT, reading TEXT, glossary TEXT)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS index_Defs_line ON Defs(line)')
+        self.db.commit()
+
+
+    def migrate(self):
+        # old .tdef files are a pickle of four parallel lists; convert on first open,
+        # keeping the original next to it as .tdef.bak. Anything else is a ValueError
+        if not os.path.isfile(self.filename) or os.path.getsize(self.filename) == 0:
+            return
+
+        with open(self.filename, 'rb') as fp:
+            if fp.read(len(SQLITE_MAGIC)) == SQLITE_MAGIC:
+                return
+            fp.seek(0)
+            try:
+                data = pickle.load(fp)
+                rows = zip(data['TranscriptLine'], data['Expression'], data['Reading'], data['Glossary'])
+            except (pickle.UnpicklingError, EOFError, KeyError, IndexError, TypeError, ValueError):
+                raise ValueError('not a definitions file: {0}'.format(self.filename))
+
+        temp = self.filename + '.tmp'
+        if os.path.exists(temp):
+            os.remove(temp)
+
+        db = sqlite3.connect(temp)
+        db.execute('CREATE TABLE Defs(id INTEGER PRIMARY KEY, line INTEGER, expression TEXT, reading TEXT, glossary TEXT)')
+        db.executemany('INSERT INTO Defs(line, expression, reading, glossary) VALUES(?, ?, ?, ?)', rows)
+        db.commit()
+        db.close()
+
+        backup = self.filename + '.bak'
+        if os.path.exists(backup):
+            os.remove(backup)
+        os.rename(self.filename, backup)
+        os.rename(temp, self.filename)
+
+
+    def findLine(self, line):
+        cursor = self.db.execute('SELECT id, expression, reading, glossary FROM Defs WHERE line=? ORDER BY id', (line,))
+        return cursor.fetchall()
+
+
+    def glossary(self, id):
+        row = self.db.execute('SELECT glossary FROM Defs WHERE id=?', (id,)).fetchone()
+        if row is not None:
+            return row[0]
+
+
+    def add(self, line, expression, reading, glossary):
+        cursor = self.db.execute('INSERT INTO Defs(line, expression, reading, glossary) VALUES(?, ?, ?, ?)', (line, expression, reading, glossary))
+        self.db.commit()
+        return cursor.lastrowid
+
+
+    def edit(self, id, glossary):
+        self.db.execute('UPDATE Defs SET glossary=? WHERE id=?', (glossary, id))
+        self.db.commit()
+
+
+    def delete(self, id):
+        self.db.execute('DELETE FROM Defs WHERE id=?', (id,))
+        self.db.commit()
+
+
+    def copyTo(self, filename):
+        # into a new file only, never merged into an existing one
+        if os.path.exists(filename):
+            raise ValueError('already exists: {0}'.format(filename))
+
+        store = DefsStore(filename)
+        rows = self.db.execute('SELECT line, expression, reading, glossary FROM Defs ORDER BY id')
+        store.db.executemany('INSERT INTO Defs(line, expression, reading, glossary) VALUES(?, ?, ?, ?)', rows)
+        store.db.commit()
+        return store
+
+
+    def compact(self):
+        # fold the WAL back into the main file; only rewrite the file (VACUUM is
+        # atomic) once deletes have left a quarter of it unused
+        if self.filename == ':memory:':
+            return
+
+        self.db.commit()
+        self.db.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+        pages = self.db.execute('PRAGMA page_count').fetchone()[0]
+        free = self.db.execute('PRAGMA freelist_count').fetchone()[0]
+        if pages > 0 and free * 4 >= pages:
+            self.db.execute('VACUUM')
+
+
+    def close(self):
+        self.compact()
+        self.db.close()
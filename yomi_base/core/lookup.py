@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2015  Christian Lott
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import bisect
+from sentence import SentenceIndex
+from yomi_base import instrument
+from yomi_base.japanese.util import isJapanese
+
+
+#
+# Lookup
+#
+
+class Lookup:
+    # Hover lookups over one text for a Translator: hit-testing against the word
+    # spans of a tokenized line, the sentence around a match and results cached per span.
+    def __init__(self, language, scanLength=20, shown=None):
+        self.language = language
+        self.scanLength = scanLength
+        self.shown = shown # results the caller displays, see Translator.findTerm
+        self.content = unicode()
+        self.sentences = None
+        self.setSpans(None)
+
+
+    def setContent(self, content):
+        self.content = content
+        self.sentences = None
+
+
+    def setSpans(self, spans):
+        self.spans = spans
+        self.spanStarts = [span[0] for span in spans or list()]
+        self.spanDefs = dict()
+
+
+    def spanAt(self, position):
+        if self.spans:
+            n = bisect.bisect_right(self.spanStarts, position) - 1
+            if n >= 0 and position < self.spans[n][0] + self.spans[n][1]:
+                return self.spans[n]
+
+
+    def find(self, position, vocab=True, kanji=True):
+        # (start, characters to select, vocab defs, kanji defs), or None when there
+        # is no Japanese text at position
+        start = position
+        span = self.spanAt(position)
+        if span is not None:
+            start = span[0] # inside a known word, look it up from its first character
+
+        sample = self.content[start:start + self.scanLength]
+        sampleFlat = sample.replace(u'\n', unicode())
+        if len(sampleFlat) == 0 or not isJapanese(sampleFlat[0]):
+            return None
+
+        vocabDefs = list()
+        kanjiDefs = list()
+        lengthMatched = 0
+
+        if vocab:
+            if span in self.spanDefs:
+                vocabDefs, lengthMatched = self.spanDefs[span]
+            else:
+                vocabDefs, lengthMatched = self.language.findTerm(sampleFlat, glossaries=self.shown)
+                if span is not None:
+                    self.spanDefs[span] = vocabDefs, lengthMatched
+
+            with instrument.stage('findSentence'):
+                if self.sentences is None:
+                    self.sentences = SentenceIndex(self.content)
+                sentence = self.sentences.find(start)
+            for definition in vocabDefs:
+                definition.sentence = sentence
+
+        if kanji:
+            with instrument.stage('findCharacters'):
+                if lengthMatched == 0:
+                    kanjiDefs = self.language.findCharacters(sampleFlat[0])
+                    if len(kanjiDefs) > 0:
+                        lengthMatched = 1
+                else:
+                    kanjiDefs = self.language.findCharacters(sampleFlat[:lengthMatched])
+
+        lengthSelect = 0
+        for c in sample:
+            if lengthMatched <= 0:
+                break
+            lengthSelect += 1
+            if c != u'\n':
+                lengthMatched -= 1
+
+        return start, lengthSelect, vocabDefs, kanjiDefs
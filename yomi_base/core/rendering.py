@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2013  Alex Yatskov
+# Copyright (C) 2015  Christian Lott
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+#
+# Templates (bound once, filled with str.format)
+#
+
+HEADER = u"""
+        <html><head><style>{0}</style></head><body>""".format
+
+FOOTER = u'</body></html>'
+
+INDEX = u'\0' # the row index in cached fragments, filled in when they are used
+
+EMPTY = u"""
+        <p>No definitions to display.</p>
+        <p>Mouse over text with the <em>middle mouse button</em> or <em>shift key</em> pressed to search.</p>
+        <p>You can also also input terms in the search box below."""
+
+VOCAB_STYLE = u"""
+        body {{ background-color: {bg} }}
+        span.expression {{ font-size: {efs}px; font-family: '{eft}'; color: {efg}; line-height: {elh}px }}
+        span.reading {{ font-size: {rfs}px; font-family: '{rft}'; color: {rfg}; line-height: {rlh}px }}
+        span.glossary {{ font-size: {gfs}px; font-family: '{gft}'; color: {gfg}; line-height: {glh}px }}
+        """.format
+
+LINE_STYLE = u"""
+        body {{ background-color: {bg} }}
+        span.expression {{ font-size: {efs}px; font-family: '{eft}'; color: {efg}; letter-spacing: {elh}px }}
+        span.reading {{ font-size: {rfs}px; font-family: '{rft}'; color: {rfg}; letter-spacing: {rlh}px }}
+        span.glossary {{ font-size: {gfs}px; font-family: '{gft}'; color: {gfg}; letter-spacing: {glh}px }}
+        """.format
+
+VOCAB_DEF = u"""
+        <span class = "links">{0}</span>
+        <span class = "expression">{1}<br/></span>
+        {2}
+        <span class = "glossary">{3}<br/></span>
+        {4}
+        <br clear = "all"/>""".format
+
+VOCAB_READING = u'<span class = "reading">[{0}]<br/></span>'.format
+VOCAB_RULES = u'<span class = "rules">({0})<br/></span>'.format
+VOCAB_LINK_COPY = u'<a href = "copyVocabDef:{0}"><img src = "img/icon_add_expression.png" align = "right"/></a>'.format
+VOCAB_LINK_EXP = u'<a href = "addVocabExp:{0}"><img src = "://img/img/icon_add_expression.png" align = "right"/></a>'.format
+VOCAB_LINK_READING = u'<a href = "addVocabReading:{0}"><img src = "://img/img/icon_add_reading.png" align = "right"/></a>'.format
+
+KANJI_DEF = u"""
+        <span class = "links">{0}</span>
+        <span class = "expression">{1}<br/></span>
+        <span class = "reading">[{2}]<br/></span>
+        <span class = "glossary">{3}<br/></span>
+        <br clear = "all"/>""".format
+
+KANJI_LINK_COPY = u'<a href = "copyKanjiDef:{0}"><img src = "://img/img/icon_copy_definition.png" align = "right"/></a>'.format
+KANJI_LINK_ADD = u'<a href = "addKanji:{0}"><img src = "://img/img/icon_add_expression.png" align = "right"/></a>'.format
+
+LINE_DEF = u"""
+        <span class = "links">{0}</span>
+        <span class = "expression">{1}</span>
+        <span class = "reading">[{2}]</span>
+        <span class = "glossary"><br/>{3}</span>
+        <br clear = "all"/><br/>""".format
+
+LINE_LINKS = (u'<a href = "deleteDef:{0}"><img src = "img/icon_action_quit.png" align = "right"/></a>'
+              u'<a><img src = "img/empty.png" align = "right"/></a>'
+              u'<a href = "editDef:{0}"><img src = "img/icon_action_zoom_reset.png" align = "right"/></a>').format
+
+
+#
+# Markup
+#
+
+def markupVocabExp(definition):
+    if definition.reading:
+        summary = u'{0.expression} [{0.reading}]'.format(definition)
+    else:
+        summary = definition.expression
+
+    return {
+        'expression': definition.expression,
+        'reading': definition.reading or unicode(),
+        'glossary': definition.glossary,
+        'sentence': definition.sentence,
+        'summary': summary
+    }
+
+
+def markupVocabReading(definition):
+    if definition.reading:
+        return {
+            'expression': definition.reading,
+            'reading': unicode(),
+            'glossary': definition.glossary,
+            'sentence': definition.sentence,
+            'summary': definition.reading
+        }
+
+
+def markupKanji(definition):
+    return {
+        'character': definition['character'],
+        'onyomi': definition['onyomi'],
+        'kunyomi': definition['kunyomi'],
+        'glossary': definition['glossary'],
+        'summary': definition['character']
+    }
+
+
+#
+# Fragments
+#
+
+def buildVocabDef(definition, index, query):
+    reading = unicode()
+    if definition.reading:
+        reading = VOCAB_READING(definition.reading)
+
+    rules = unicode()
+    if len(definition.rules) > 0:
+        rules = VOCAB_RULES(' &lt; '.join(definition.rules))
+
+    links = VOCAB_LINK_COPY(index)
+    if query is not None:
+        if query('vocab', markupVocabExp(definition)):
+            links += VOCAB_LINK_EXP(index)
+        if query('vocab', markupVocabReading(definition)):
+            links += VOCAB_LINK_READING(index)
+
+    return VOCAB_DEF(links, definition.expression, reading, definition.glossary, rules)
+
+
+def buildKanjiDef(definition, index, query):
+    links = KANJI_LINK_COPY(index)
+    if query is not None and query('kanji', markupKanji(definition)):
+        links += KANJI_LINK_ADD(index)
+
+    readings = ', '.join([definition['kunyomi'], definition['onyomi']])
+    return KANJI_DEF(links, definition['character'], readings, definition['glossary'])
+
+
+def buildLineDef(expression, reading, glossary, index):
+    return LINE_DEF(LINE_LINKS(index), expression, reading, glossary)
+
+
+#
+# Renderer
+#
+
+class Renderer:
+    # Holds the style sheet for one panel (rebuilt only when the theme changes)
+    # and the html of recently rendered entries, keyed by what they display, so
+    # an entry is reused wherever it appears in later results.
+    def __init__(self, style, cacheSize=512):
+        self.style = style
+        self.cacheSize = cacheSize
+        self.fragments = dict()
+        self.stylesheet = unicode()
+        self.header = HEADER(self.stylesheet)
+
+
+    def setTheme(self, **theme):
+        stylesheet = self.style(**theme)
+        if stylesheet != self.stylesheet:
+            self.stylesheet = stylesheet
+            self.header = HEADER(stylesheet)
+            return True
+
+        return False
+
+
+    def fragment(self, key, index, build, *args):
+        parts = self.fragments.get(key)
+        if parts is None:
+            # a full cache starts over, which is cheaper than keeping it in LRU order
+            if len(self.fragments) >= self.cacheSize:
+                self.fragments.clear()
+            parts = self.fragments[key] = build(*args).split(INDEX)
+
+        return unicode(index).join(parts)
+
+
+    def vocabDefs(self, definitions, query):
+        html = [self.header]
+        for i, definition in enumerate(definitions):
+            if query is None:
+                key = 'vocab', definition.expression, definition.reading, definition.glossary, tuple(definition.rules)
+                html.append(self.fragment(key, i, buildVocabDef, definition, INDEX, query))
+            else:
+                html.append(buildVocabDef(definition, i, query))
+
+        if len(definitions) == 0:
+            html.append(EMPTY)
+
+        html.append(FOOTER)
+        return u''.join(html)
+
+
+    def kanjiDefs(self, definitions, query):
+        html = [self.header]
+        for i, definition in enumerate(definitions):
+            if query is None:
+                key = 'kanji', definition['character'], definition['kunyomi'], definition['onyomi'], definition['glossary']
+                html.append(self.fragment(key, i, buildKanjiDef, definition, INDEX, query))
+            else:
+                html.append(buildKanjiDef(definition, i, query))
+
+        if len(definitions) == 0:
+            html.append(EMPTY)
+
+        html.append(FOOTER)
+        return u''.join(html)
+
+
+    def lineDef(self, expression, reading, glossary, index):
+        key = 'line', expression, reading, glossary
+        return self.fragment(key, index, buildLineDef, expression, reading, glossary, INDEX)
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2013  Alex Yatskov
+# Copyright (C) 2015  Christian Lott
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import bisect
+
+
+QUOTES_FWD = {u'「': u'」', u'『': u'』', u"'": u"'", u'"': u'"'}
+QUOTES_BWD = {u'」': u'「', u'』': u'『', u"'": u"'", u'"': u'"'}
+TERMINATORS = u'。．.？?！!'
+
+
+#
+# SentenceIndex
+#
+
+class SentenceIndex:
+    # Sentence boundaries of one text (a subtitle line or a whole document), built
+    # once so that find() only bisects. Same rules as the old findSentence scan:
+    # a quote opened on the way out is skipped up to its matching quote.
+    def __init__(self, content):
+        self.content = content
+
+        self.backStops = list() # terminators, opening quotes, newlines, closing quotes
+        self.forwardStops = list() # terminators, any quote
+        quotes = list()
+
+        for i, c in enumerate(content):
+            isQuote = c in QUOTES_FWD or c in QUOTES_BWD
+            if i > 0 and (isQuote or c in TERMINATORS or c == u'\n'):
+                self.backStops.append(i)
+            if isQuote or c in TERMINATORS:
+                self.forwardStops.append(i)
+            if isQuote:
+                quotes.append(i)
+
+        # closing quote -> its opening quote scanning backward (None: never closed)
+        self.opener = dict()
+        for n, i in enumerate(quotes):
+            if i > 0 and content[i] in QUOTES_BWD:
+                self.opener[i] = self.match(quotes, n, -1, QUOTES_BWD, self.opener)
+
+        # opening quote -> its closing quote scanning forward
+        self.closer = dict()
+        for n in xrange(len(quotes) - 1, -1, -1):
+            i = quotes[n]
+            if content[i] in QUOTES_FWD:
+                self.closer[i] = self.match(quotes, n, 1, QUOTES_FWD, self.closer)
+
+
+    def match(self, quotes, n, step, pairs, matched):
+        # quotes nested inside were matched already, so they are jumped over
+        content = self.content
+        want = pairs[content[quotes[n]]]
+
+        n += step
+        while 0 <= n < len(quotes):
+            i = quotes[n]
+            if i == 0 and step < 0:
+                break
+
+            c = content[i]
+            if c == want:
+                return i
+            if c in pairs:
+                inner = matched[i]
+                if inner is None:
+                    break
+                n = bisect.bisect_left(quotes, inner)
+
+            n += step
+
+
+    def find(self, position):
+        content = self.content
+
+        start = 0
+        i = position
+        while i > 0:
+            n = bisect.bisect_right(self.backStops, i) - 1
+            if n < 0:
+                break
+
+            stop = self.backStops[n]
+            c = content[stop]
+            if c in TERMINATORS or c in QUOTES_FWD or c == u'\n':
+                start = stop + 1
+                break
+
+            opener = self.opener[stop]
+            if opener is None:
+                break
+            i = opener - 1
+
+        end = len(content)
+        i = position
+        while i < len(content):
+            n = bisect.bisect_left(self.forwardStops, i)
+            if n == len(self.forwardStops):
+                break
+
+            stop = self.forwardStops[n]
+            c = content[stop]
+            if c in TERMINATORS:
+                end = stop + 1
+                break
+            if c in QUOTES_BWD:
+                end = stop
+                break
+
+            closer = self.closer[stop]
+            if closer is None:
+                break
+            i = closer + 1
+
+        return content[start:end].strip()
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2015  Christian Lott
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import bisect
+
+
+#
+# Timeline
+#
+
+class Timeline:
+    # Cues of one transcript as (start ms, end ms, text) and the row playback is at.
+    def __init__(self, cues=None):
+        self.load(list(cues or ()))
+
+
+    def __len__(self):
+        return len(self.cues)
+
+
+    def load(self, cues):
+        self.cues = cues
+        self.starts = [cue[0] for cue in cues]
+        self.row = 0
+
+
+    def text(self, row):
+        return self.cues[row][2]
+
+
+    def seek(self, row):
+        # jump to a row, returns the time to seek playback to
+        self.row = row
+        return self.cues[row][0]
+
+
+    def ended(self, time):
+        return len(self.cues) > 0 and time > self.cues[self.row][1]
+
+
+    def tick(self, time):
+        # follow playback forward to the last cue started before time;
+        # True when the row changed
+        row = bisect.bisect_left(self.starts, time) - 1
+        if row > self.row:
+            self.row = row
+            return True
+
+        return False
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2015  Christian Lott
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import collections
+import os
+import threading
+import timeit
+
+
+# Opt-in lookup latency breakdown. Stages only record inside a root stage (one
+# hover lookup) on the same thread, so the tokenizer thread and batch workers
+# running the same code are not counted. A stage's time excludes the stages nested
+# in it and is summed over the lookup, giving one sample per stage per lookup.
+
+enabled = os.environ.get('TP_INSTRUMENT', '') not in ('', '0')
+window = 1000 # samples kept per histogram
+
+histograms = collections.OrderedDict()
+local = threading.local()
+
+
+#
+# Histogram
+#
+
+class Histogram:
+    def __init__(self, size):
+        self.samples = collections.deque(maxlen=size)
+        self.count = 0
+
+
+    def add(self, value):
+        self.samples.append(value)
+        self.count += 1
+
+
+    def percentiles(self, *points):
+        samples = sorted(self.samples)
+        if len(samples) == 0:
+            return [0.0] * len(points)
+
+        return [samples[min(int(len(samples) * p / 100.0), len(samples) - 1)] for p in points]
+
+
+    def mean(self):
+        if len(self.samples) == 0:
+            return 0.0
+        return sum(self.samples) / float(len(self.samples))
+
+
+def record(name, value):
+    histogram = histograms.get(name)
+    if histogram is None:
+        histogram = histograms[name] = Histogram(window)
+    histogram.add(value)
+
+
+def reset():
+    histograms.clear()
+
+
+#
+# Stages
+#
+
+class Stage:
+    def __init__(self, name, stack):
+        self.name = name
+        self.stack = stack
+        self.children = 0.0
+
+        # on the root stage: time per stage name and queries over the whole lookup
+        self.stages = dict()
+        self.queries = 0
+
+
+    def __enter__(self):
+        self.stack.append(self)
+        self.start = timeit.default_timer()
+        return self
+
+
+    def __exit__(self, *exc):
+        elapsed = timeit.default_timer() - self.start
+        self.stack.pop()
+
+        root = self.stack[0] if self.stack else self
+        root.stages[self.name] = root.stages.get(self.name, 0.0) + elapsed - self.children
+
+        if self.stack:
+            self.stack[-1].children += elapsed
+        else:
+            for name, seconds in self.stages.items():
+                record(name, seconds * 1000.0)
+            record(self.name + '.total', elapsed * 1000.0)
+            record(self.name + '.queries', self.queries)
+
+
+class NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+nullStage = NullStage()
+
+
+def stage(name, root=False):
+    if not enabled:
+        return nullStage
+
+    stack = getattr(local, 'stack', None)
+    if stack is None:
+        stack = local.stack = list()
+    if not root and not stack:
+        return nullStage
+
+    return Stage(name, stack)
+
+
+def query(count=1):
+    # a dictionary query made inside the current root stage
+    stack = getattr(local, 'stack', None)
+    if enabled and stack:
+        stack[0].queries += count
+
+
+#
+# Reports
+#
+
+def report():
+    # (name, samples, mean, p50, p95, p99) per histogram; times in ms
+    rows = list()
+    for name, histogram in histograms.items():
+        p50, p95, p99 = histogram.percentiles(50, 95, 99)
+        rows.append((name, histogram.count, histogram.mean(), p50, p95, p99))
+
+    return rows
+
+
+def exportCsv(filename):
+    import csv
+
+    with open(filename, 'wb') as fp:
+        writer = csv.writer(fp)
+        writer.writerow(['stage', 'samples', 'mean', 'p50', 'p95', 'p99'])
+        for name, count, mean, p50, p95, p99 in report():
+            writer.writerow([name, count, '{0:.4f}'.format(mean), '{0:.4f}'.format(p50), '{0:.4f}'.format(p95), '{0:.4f}'.format(p99)])
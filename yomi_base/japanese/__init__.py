@@ -20,9 +20,10 @@ import deinflect
 import dictionary
 import sys, os.path
 import translate
+from yomi_base import constants
 # from PySide import QtCore
 
-def initLanguage():
+def initLanguage(shared=False):
     # os.path.dirname(os.path.abspath(file))
     # (QtCore.QDir.currentPath() + "/session")
     # directory = os.path.dirname(__file__)
@@ -36,7 +37,14 @@ def initLanguage():
     else:
         directory = os.path.dirname(sys.executable) + "/yomi_base/japanese"
 
+    # dictionary.db and any further dictionaries (names, glossaries) listed after it
+    names = constants.c['dictionaries']
+    database = dictionary.Dictionary(os.path.join(directory, names[0]), shared=shared)
+    for name in names[1:]:
+        if os.path.exists(os.path.join(directory, name)):
+            database.attach(os.path.join(directory, name))
+
     return translate.Translator(
         deinflect.Deinflector(os.path.join(directory, 'deinflect.json')),
-        dictionary.Dictionary(os.path.join(directory, 'dictionary.db'))
+        database
     )
@@ -44,32 +44,32 @@ class Deinflection:
                     return True
 
 
-    def deinflect(self, validator, rules):
+    def deinflect(self, validator, endings):
         if self.validate(validator):
             child = Deinflection(self.term)
             self.children.append(child)
 
-        for rule, variants in rules.items():
-            for variant in variants:
-                tagsIn = variant['tagsIn']
-                tagsOut = variant['tagsOut']
-                kanaIn = variant['kanaIn']
-                kanaOut = variant['kanaOut']
+        # only the variants whose kanaIn ends like the term can apply
+        for rule, variant in endings.get(self.term[-1:], ()):
+            tagsIn = variant['tagsIn']
+            tagsOut = variant['tagsOut']
+            kanaIn = variant['kanaIn']
+            kanaOut = variant['kanaOut']
 
-                allowed = len(self.tags) == 0
-                for tag in self.tags:
-                    if self.searchTags(tag, tagsIn):
-                        allowed = True
-                        break
+            allowed = len(self.tags) == 0
+            for tag in self.tags:
+                if self.searchTags(tag, tagsIn):
+                    allowed = True
+                    break
 
-                if not allowed or not self.term.endswith(kanaIn):
-                    continue
+            if not allowed or not self.term.endswith(kanaIn):
+                continue
 
-                term = self.term[:-len(kanaIn)] + kanaOut
+            term = self.term[:-len(kanaIn)] + kanaOut
 
-                child = Deinflection(term, tagsOut, rule)
-                if child.deinflect(validator, rules):
-                    self.children.append(child)
+            child = Deinflection(term, tagsOut, rule)
+            if child.deinflect(validator, endings):
+                self.children.append(child)
 
         if len(self.children) > 0:
             return True
@@ -105,8 +105,14 @@ class Deinflector:
         with codecs.open(filename, 'rb', 'utf-8') as fp:
             self.rules = json.load(fp)
 
+        # (rule, variant) pairs by the last character of kanaIn, in rule order
+        self.endings = dict()
+        for rule, variants in self.rules.items():
+            for variant in variants:
+                self.endings.setdefault(variant['kanaIn'][-1:], list()).append((rule, variant))
+
 
     def deinflect(self, term, validator):
         node = Deinflection(term)
-        if node.deinflect(validator, self.rules):
+        if node.deinflect(validator, self.endings):
             return node.gather()
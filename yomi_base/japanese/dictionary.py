@@ -18,41 +18,194 @@
 
 import operator
 import sqlite3
+import util
+import zlib
+from yomi_base import instrument
 
 
+#
+# Term
+#
+
+class Term(object):
+    # one Terms row as findTerm returns it; tags stay a space separated string and
+    # dictionary is the position of its database in the search order.
+    # source and rules are set by the translator, sentence by the lookup
+    __slots__ = ('id', 'expression', 'reading', 'glossary', 'tags', 'rank', 'dictionary', 'rules', 'source', 'sentence')
+
+    def __init__(self, id, expression, reading, glossary, tags, rank, dictionary=0, rules=()):
+        self.id = id
+        self.expression = expression
+        self.reading = reading
+        self.glossary = glossary
+        self.tags = tags
+        self.rank = rank
+        self.dictionary = dictionary
+        self.rules = rules
+        self.source = None
+        self.sentence = None
+
+
+#
+# Dictionary
+#
+
 class Dictionary:
-    def __init__(self, filename, index=True):
-        self.db = sqlite3.connect(filename)
+    def __init__(self, filename, index=True, readonly=False, shared=False):
+        # shared: opened on one thread and used on another, see loader.py
+        self.db = sqlite3.connect(filename, check_same_thread=not shared)
         self.indices = set()
+        self.readonly = readonly
+        if readonly:
+            self.db.execute('PRAGMA query_only=ON')
+
+        # the databases searched, in order of priority; attach adds more
+        self.schemas = list()
+        self.addSchema('main')
+
+
+    def attach(self, filename):
+        # search another dictionary database (a names list, a domain glossary) after
+        # the ones already open; one query covers all of them
+        schema = 'dictionary{0}'.format(len(self.schemas))
+        self.db.execute('ATTACH DATABASE ? AS {0}'.format(schema), (filename,))
+        self.addSchema(schema)
+
+
+    def addSchema(self, schema):
+        # databases from compile.py have hiragana-folded expnorm/readnorm columns;
+        # older ones are matched on expression and reading as written
+        columns = [row[1] for row in self.db.execute('PRAGMA {0}.table_info(Terms)'.format(schema))]
+        normalized = 'expnorm' in columns
+
+        # and a precomputed rank; without it, (P) entries rank as common words
+        rank = 'rank'
+        if 'rank' not in columns:
+            rank = "CASE WHEN ' ' || tags || ' ' LIKE '% P %' THEN {0} ELSE {1} END".format(util.RANK_COMMON, util.RANK_UNRANKED)
+
+        # and may keep glossaries compressed in blocks in their own table, for findGlossaries
+        compressed = self.hasTable('Glossary', schema)
+        glossaryBlock = None
+        if compressed:
+            glossaryBlock = int(self.db.execute('SELECT value FROM {0}.Meta WHERE name=?'.format(schema), ('glossaryBlock',)).fetchone()[0])
+
+        self.schemas.append({
+            'name': schema,
+            'normalized': normalized,
+            'termColumns': ('expnorm', 'readnorm') if normalized else ('expression', 'reading'),
+            'rankColumn': rank,
+            'compressed': compressed,
+            'glossaryColumn': 'NULL' if compressed else 'glossary',
+            'glossaryBlock': glossaryBlock,
+            # and the inflected forms of verbs and adjectives, for findInflections
+            'inflected': self.hasTable('Inflections', schema)
+        })
+
+        # the translator folds text only when every database is folded, looks
+        # inflected forms up in the ones that have them, and deinflects for the rest
+        self.federated = len(self.schemas) > 1
+        self.normalized = all(s['normalized'] for s in self.schemas)
+        self.inflected = any(s['inflected'] for s in self.schemas)
+        self.deinflected = not all(s['inflected'] for s in self.schemas)
+
+        # each database is one arm of a UNION ALL, its results ordered by its priority first
+        terms = list()
+        inflections = list()
+        for i, s in enumerate(self.schemas):
+            expression, reading = s['termColumns']
+            terms.append('SELECT rowid, expression, reading, {0}, tags, {1} AS rank, {2} AS dictionary FROM {3}.Terms WHERE {4} {{0}} ? OR {5}=?'.format(
+                s['glossaryColumn'], s['rankColumn'], i, s['name'], expression, reading))
+            if s['inflected']:
+                inflections.append('SELECT t.rowid, expression, reading, {0}, tags, {1} AS rank, {2} AS dictionary, r.rules FROM {3}.Inflections i JOIN {3}.Terms t ON t.rowid=i.id JOIN {3}.InflectionRules r ON r.id=i.rules WHERE form=?'.format(
+                    s['glossaryColumn'], s['rankColumn'], i, s['name']))
+
+        terms = ' UNION ALL '.join(terms) + ' ORDER BY dictionary, rank LIMIT 100'
+        self.termQueries = {False: terms.format('='), True: terms.format('LIKE')}
+        self.inflectionQuery = ' UNION ALL '.join(inflections) + ' ORDER BY dictionary, rank LIMIT 100'
+
+
+    def requireIndices(self):
+        # build every index up front (for connections shared with read-only workers)
+        for schema in self.schemas:
+            for column in schema['termColumns']:
+                self.requireIndex('Terms', column, schema['name'])
+            if schema['inflected']:
+                self.requireIndex('Inflections', 'form', schema['name'])
+        self.requireIndex('Kanji', 'character')
 
 
     def findTerm(self, word, wildcards=False):
-        self.requireIndex('Terms', 'expression')
-        self.requireIndex('Terms', 'reading')
+        folded = None
+        params = list()
+        for schema in self.schemas:
+            expression, reading = schema['termColumns']
+            self.requireIndex('Terms', expression, schema['name'])
+            self.requireIndex('Terms', reading, schema['name'])
+            if schema['normalized']:
+                folded = folded or util.normalize(word)
+                params += folded, folded
+            else:
+                params += word, word
 
-        cursor = self.db.cursor()
-        cursor.execute('SELECT * FROM Terms WHERE expression {0} ? OR reading=? LIMIT 100'.format('LIKE' if wildcards else '='), (word, word))
+        instrument.query()
+        with instrument.stage('sql'):
+            cursor = self.db.cursor()
+            cursor.execute(self.termQueries[wildcards], params)
+            rows = cursor.fetchall()
 
-        results = list()
-        for expression, reading, glossary, tags in cursor.fetchall():
-            results.append({
-                'expression': expression,
-                'reading': reading,
-                'glossary': glossary,
-                'tags': tags.split()
-            })
+        return [Term(*row) for row in rows]
 
-        return results
+
+    def findInflections(self, word):
+        # entries word is an inflected form of, each with the rules from its dictionary
+        # form outwards as the deinflector lists them
+        schemas = [schema['name'] for schema in self.schemas if schema['inflected']]
+        for schema in schemas:
+            self.requireIndex('Inflections', 'form', schema)
+        word = util.normalize(word)
+
+        instrument.query()
+        with instrument.stage('sql'):
+            cursor = self.db.cursor()
+            cursor.execute(self.inflectionQuery, (word,) * len(schemas))
+            rows = cursor.fetchall()
+
+        return [Term(id, expression, reading, glossary, tags, rank, dictionary, rules.split('|')) for id, expression, reading, glossary, tags, rank, dictionary, rules in rows]
+
+
+    def findGlossaries(self, results):
+        # fills in the glossaries findTerm left out of compressed databases
+        missing = [result for result in results if result.glossary is None]
+        for i, schema in enumerate(self.schemas):
+            if not schema['compressed']:
+                continue
+            entries = [result for result in missing if result.dictionary == i]
+            if not entries:
+                continue
+
+            size = schema['glossaryBlock']
+            blocks = list(set(result.id // size for result in entries))
+            instrument.query()
+            with instrument.stage('sql'):
+                cursor = self.db.cursor()
+                cursor.execute('SELECT block, glossaries FROM {0}.Glossary WHERE block IN ({1})'.format(schema['name'], ', '.join('?' * len(blocks))), blocks)
+                rows = cursor.fetchall()
+
+            slots = dict((block, zlib.decompress(glossaries).decode('utf-8').split(u'\0')) for block, glossaries in rows)
+            for result in entries:
+                result.glossary = slots[result.id // size][result.id % size]
 
 
     def findCharacter(self, character):
         assert len(character) == 1
         self.requireIndex('Kanji', 'character')
 
-        cursor = self.db.cursor()
-        cursor.execute('SELECT * FROM Kanji WHERE character=? LIMIT 1', character)
+        instrument.query()
+        with instrument.stage('sql'):
+            cursor = self.db.cursor()
+            cursor.execute('SELECT character, kunyomi, onyomi, glossary FROM Kanji WHERE character=? LIMIT 1', character)
+            query = cursor.fetchone()
 
-        query = cursor.fetchone()
         if query is not None:
             character, kunyomi, onyomi, glossary = query
             return {
@@ -63,24 +216,68 @@ class Dictionary:
             }
 
 
-    def requireIndex(self, table, column):
-        name = 'index_{0}_{1}'.format(table, column)
-        if not self.hasIndex(name):
+    def version(self):
+        # Meta.version, bumped by every build or update; None for databases built
+        # before it existed
+        cursor = self.db.cursor()
+        try:
+            cursor.execute('SELECT value FROM Meta WHERE name=?', ('version',))
+        except sqlite3.OperationalError:
+            return None
+
+        query = cursor.fetchone()
+        return None if query is None else int(query[0])
+
+
+    def changes(self, since):
+        # words (expressions, readings and characters) whose lookups may have changed
+        # after version since, or None when a table was rebuilt or the log does not
+        # reach back that far, meaning anything may have changed
+        current = self.version()
+        if current is None or since is None:
+            return None
+
+        cursor = self.db.cursor()
+        cursor.execute('SELECT MIN(version) FROM Changelog')
+        first = cursor.fetchone()[0]
+        if since < current and (first is None or first > since + 1):
+            return None
+
+        cursor.execute('SELECT action, word, reading FROM Changelog WHERE version > ?', (since,))
+        words = set()
+        for action, word, reading in cursor.fetchall():
+            if action == 'rebuild':
+                return None
+            words.update(filter(None, [word, reading]))
+
+        return words
+
+
+    def requireIndex(self, table, column, schema='main'):
+        name = '{0}.index_{1}_{2}'.format(schema, table, column)
+        if not self.readonly and not self.hasIndex(name):
             self.buildIndex(name, table, column)
 
 
     def buildIndex(self, name, table, column):
         cursor = self.db.cursor()
-        cursor.execute('CREATE INDEX {0} ON {1}({2})'.format(name, table, column))
+        cursor.execute('CREATE INDEX IF NOT EXISTS {0} ON {1}({2})'.format(name, table, column))
         self.db.commit()
 
 
+    def hasTable(self, name, schema='main'):
+        cursor = self.db.cursor()
+        cursor.execute("SELECT 1 FROM {0}.sqlite_master WHERE type='table' AND name=?".format(schema), (name,))
+        return cursor.fetchone() is not None
+
+
     def hasIndex(self, name):
         if name in self.indices:
             return True
 
+        schema, index = name.split('.')
         cursor = self.db.cursor()
-        cursor.execute('SELECT * FROM sqlite_master WHERE name=?', (name,))
+        cursor.execute('SELECT * FROM {0}.sqlite_master WHERE name=?'.format(schema), (index,))
         if len(cursor.fetchall()) == 0:
             return False
 
@@ -17,8 +17,8 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
-import operator
 import util
+from yomi_base import instrument
 
 
 class Translator:
@@ -27,30 +27,85 @@ class Translator:
         self.dictionary = dictionary
 
 
-    def findTerm(self, text, wildcards=False):
-        text = util.sanitize(text, wildcards=wildcards)
+    def findTerm(self, text, wildcards=False, glossaries=None):
+        # glossaries: how many of the first results will be shown and need their
+        # glossary (all when None); the rest may lack it with a compressed dictionary
+        with instrument.stage('sanitize'):
+            text = util.sanitize(text, wildcards=wildcards)
+            if self.dictionary.normalized:
+                # deinflect and look up the folded text, so katakana and mixed
+                # script words match too; lengths match the original text
+                text = util.normalize(text)
 
         groups = dict()
         for i in xrange(len(text), 0, -1):
             term = text[:i]
-            deinflections = self.deinflector.deinflect(term, self.validator)
-            if deinflections is None:
-                self.processTerm(groups, term, wildcards=wildcards)
-            else:
-                for deinflection in deinflections:
-                    self.processTerm(groups, **deinflection)
-
-        results = map(self.formatResult, groups.items())
-        results = filter(operator.truth, results)
-        results = sorted(results, key=lambda d: (len(d['source']), 'P' in d['tags'], -len(d['rules'])), reverse=True)
+            inflections = list()
+            if self.dictionary.inflected:
+                # inflected forms precomputed by compile.py: one exact lookup
+                # in place of deinflecting
+                with instrument.stage('group'):
+                    inflections = self.dictionary.findInflections(term)
+                if inflections and not self.dictionary.deinflected:
+                    with instrument.stage('group'):
+                        self.processTerm(groups, term, wildcards=wildcards)
+                        for entry in inflections:
+                            self.addEntry(groups, entry, term, entry.rules)
+                    continue
+
+            # and deinflected otherwise, which also finds the chains longer
+            # than the table's --inflection-depth and covers the databases
+            # built without one
+            with instrument.stage('deinflect'):
+                deinflections = self.deinflector.deinflect(term, self.validator)
+            with instrument.stage('group'):
+                if deinflections is None:
+                    self.processTerm(groups, term, wildcards=wildcards)
+                else:
+                    for deinflection in deinflections:
+                        self.processTerm(groups, **deinflection)
+                for entry in inflections:
+                    self.addEntry(groups, entry, term, entry.rules)
+
+        with instrument.stage('sort'):
+            results = sorted(groups.itervalues(), key=lambda d: (-len(d.source), d.dictionary, d.rank, len(d.rules)))
+
+        self.dictionary.findGlossaries(results[:glossaries])
+        if self.dictionary.federated:
+            results = self.dedupe(results)
+            self.dictionary.findGlossaries(results[:glossaries])
 
         length = 0
         for result in results:
-            length = max(length, len(result['source']))
+            length = max(length, len(result.source))
 
         return results, length
 
 
+    def segment(self, text, scanLength=16):
+        # greedy longest-match split of text into (start, length, entry id) spans;
+        # characters no term starts at are left out
+        spans = list()
+
+        i = 0
+        while i < len(text):
+            end = i
+            while end < len(text) and end - i < scanLength and util.isJapanese(text[end]):
+                end += 1
+
+            length = 0
+            if end > i:
+                results, length = self.findTerm(text[i:end], glossaries=0)
+
+            if length > 0:
+                spans.append((i, length, results[0].id))
+                i += length
+            else:
+                i += 1
+
+        return spans
+
+
     def findCharacters(self, text):
         text = util.sanitize(text, kana=False)
         results = list()
@@ -70,22 +125,32 @@ class Translator:
         root = root or source
 
         for entry in self.dictionary.findTerm(root, wildcards):
-            key = entry['expression'], entry['reading'], entry['glossary']
-            if key not in groups:
-                groups[key] = entry['tags'], source, rules
+            self.addEntry(groups, entry, source, rules)
+
 
+    def addEntry(self, groups, entry, source, rules):
+        # the first (longest) match of each Terms row wins; the record is fresh from
+        # this lookup, so it becomes the result
+        key = (entry.dictionary, entry.id) if self.dictionary.federated else entry.id
+        if key not in groups:
+            entry.source = source
+            entry.rules = rules
+            groups[key] = entry
+
+
+    def dedupe(self, results):
+        # an entry several dictionaries have word for word is kept once, from the one
+        # searched first; entries whose glossary is not loaded are all kept
+        seen = set()
+        unique = list()
+        for result in results:
+            key = result.expression, result.reading, result.glossary or (result.dictionary, result.id)
+            if key not in seen:
+                seen.add(key)
+                unique.append(result)
 
-    def formatResult(self, group):
-        (expression, reading, glossary), (tags, source, rules) = group
-        return {
-            'expression': expression,
-            'reading': reading,
-            'glossary': glossary,
-            'rules': rules,
-            'source': source,
-            'tags': tags
-        }
+        return unique
 
 
     def validator(self, term):
-        return [d['tags'] for d in self.dictionary.findTerm(term)]
+        return [d.tags.split() for d in self.dictionary.findTerm(term)]
@@ -37,7 +37,80 @@ def isKanji(c):
 
 
 def isJapanese(c):
-    return isKana(c) or isKanji(c)
+    return isKana(c) or isKanji(c) or c == ITERATION_MARK
+
+
+ITERATION_MARK = u'\u3005' # 々
+LONG_VOWEL_MARK = u'\u30fc' # ー
+
+VOWELS = {c: vowel for vowel, kana in [
+    (u'あ', u'あかさたなはまやらわがざだばぱぁゃゎ'),
+    (u'い', u'いきしちにひみりぎじぢびぴぃ'),
+    (u'う', u'うくすつぬふむゆるぐずづぶぷぅゅっゔ'),
+    (u'え', u'えけせてねへめれげぜでべぺぇ'),
+    (u'お', u'おこそとのほもよろをごぞどぼぽぉょ'),
+] for c in kana}
+
+VOICED = u'かきくけこさしすせそたちつてとはひふへほ'
+HIRAGANA = {o: o - 0x60 for o in range(0x30a1, 0x30f7) + [0x30fd, 0x30fe]}
+FOLDED = re.compile(u'[\u30a1-\u30f6\u30fd\u30fe]')
+MARKS = re.compile(u'[\u30fc\u309d\u309e\u3005]')
+
+
+def normalize(text):
+    # hiragana-folded form of an expression or reading, so カード, かーど and かあど
+    # compare equal: katakana become hiragana, ー repeats the vowel before it and
+    # ゝゞ々 the character before them. Lengths are unchanged
+    if text is None:
+        return None
+
+    if FOLDED.search(text) is not None:
+        text = text.translate(HIRAGANA)
+    if MARKS.search(text) is None:
+        return text
+
+    result = list()
+    for c in text:
+        if result:
+            previous = result[-1]
+            if c == LONG_VOWEL_MARK:
+                c = VOWELS.get(previous, c)
+            elif c in (u'ゝ', ITERATION_MARK):
+                c = previous
+            elif c == u'ゞ':
+                c = unichr(ord(previous) + 1) if previous in VOICED else previous
+
+        result.append(c)
+
+    return u''.join(result)
+
+
+# priority markers: EDICT's (P) and the JMdict codes it is derived from, then the
+# second tier JMdict codes
+COMMON_PRIORITIES = {'P', 'news1', 'ichi1', 'spec1', 'spec2', 'gai1'}
+UNCOMMON_PRIORITIES = {'news2', 'ichi2', 'gai2'}
+
+RANK_COMMON = 24000 # after every nfXX bucket
+RANK_UNCOMMON = 48000
+RANK_UNRANKED = 1000000
+
+
+def rank(priorities, position=None):
+    # lower ranks sort first: the word's position in a frequency list, JMdict's
+    # nfXX bucket of 500 words, or a rank for common and second tier words
+    ranks = [RANK_UNRANKED]
+    if position is not None:
+        ranks.append(position)
+
+    for priority in priorities:
+        if priority.startswith('nf') and priority[2:].isdigit():
+            ranks.append(int(priority[2:]) * 500)
+        elif priority in COMMON_PRIORITIES:
+            ranks.append(RANK_COMMON)
+        elif priority in UNCOMMON_PRIORITIES:
+            ranks.append(RANK_UNCOMMON)
+
+    return min(ranks)
 
 
 def sanitize(text, kana=True, wildcards=False):
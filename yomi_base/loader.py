@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2015  Christian Lott
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from PySide import QtCore
+import japanese
+
+
+class LanguageLoader(QtCore.QThread):
+    # Parses the deinflection rules and opens the dictionaries, building any missing
+    # index, off the GUI thread; the Translator is handed over to it once ready.
+    ready = QtCore.Signal(object)
+
+    def run(self):
+        language = japanese.initLanguage(shared=True)
+        language.dictionary.requireIndices()
+        self.ready.emit(language)
@@ -1,8 +1,14 @@
 # -*- coding: utf-8 -*-
 
 from PySide import QtGui, QtCore
+import constants
+import instrument
+import profiling
 import japanese.util
 import reader_util
+import timeit
+from core.lookup import Lookup
+from loader import LanguageLoader
 
 class MiniReader(QtGui.QPlainTextEdit): # QtGui.QMainWindow, gen.reader_ui.Ui_MainWindowReader
     class State:
@@ -39,12 +45,33 @@ class MiniReader(QtGui.QPlainTextEdit): # QtGui.QMainWindow, gen.reader_ui.Ui_Ma
         self.mousePressEvent = self.onContentMousePress
 
         self.facts = list()
-        self.language = japanese.initLanguage()
+
+        # the lookup engine loads in the background; a lookup or search asked for
+        # before it is ready runs once it is
+        self.language = None
+        self.lookup = Lookup(None, shown=constants.c['maxResults'])
+        self.pendingLookup = False
+        self.pendingVocabSearch = False
+        self.pendingKanjiSearch = False
+        self.loader = LanguageLoader()
+        self.loader.ready.connect(self.onLanguageReady)
+        self.loader.start()
         #self.preferences = preferences
         self.state = self.State()
         #self.updater = update.UpdateFinder()
         self.zoom = 0
 
+        # hover lookups: plain text cached until the content changes, at most one
+        # lookup per lookupInterval ms with the last position resolved on a timer
+        self.content = None
+        self.lastLookup = None
+        self.lastLookupTime = float('-inf') # default_timer may start near 0
+        self.lookupInterval = constants.c['lookupInterval']
+        self.lookupTimer = QtCore.QTimer(self)
+        self.lookupTimer.setSingleShot(True)
+        self.lookupTimer.timeout.connect(self.onLookupTimer)
+        self.textChanged.connect(self.onTextChanged)
+
         #self.applyPreferences()
         #self.updateRecentFiles()
         #self.updateVocabDefs()
@@ -106,7 +133,7 @@ class MiniReader(QtGui.QPlainTextEdit): # QtGui.QMainWindow, gen.reader_ui.Ui_Ma
         elif event.key() == ord('[') and self.state.scanPosition > 0:
             self.state.scanPosition -= 1
             self.updateSampleFromPosition()
-        elif event.key() == ord(']') and self.state.scanPosition < len(self.textContent.toPlainText()) - 1:
+        elif event.key() == ord(']') and self.state.scanPosition < len(self.plainText()) - 1:
             self.state.scanPosition += 1
             self.updateSampleFromPosition()
 
@@ -148,6 +175,7 @@ class MiniReader(QtGui.QPlainTextEdit): # QtGui.QMainWindow, gen.reader_ui.Ui_Ma
         self.setLineWrapMode(QtGui.QPlainTextEdit.WidgetWidth if self.preferences['wordWrap'] else QtGui.QPlainTextEdit.NoWrap)
 
 
+    @profiling.handler
     def onVocabDefsAnchorClicked(self, url):
         command, index = unicode(url.toString()).split(':')
         self.executeVocabCommand(command, int(index))
@@ -159,8 +187,12 @@ class MiniReader(QtGui.QPlainTextEdit): # QtGui.QMainWindow, gen.reader_ui.Ui_Ma
 
 
     def onVocabDefSearchReturn(self):
+        if self.language is None:
+            self.pendingVocabSearch = True
+            return
+
         text = unicode(self.textVocabSearch.text())
-        self.state.vocabDefs, length = self.language.findTerm(text, True)
+        self.state.vocabDefs, length = self.language.findTerm(text, True, constants.c['maxResults'])
         self.updateVocabDefs()
         if self.dockKanji.isVisible():
             self.state.kanjiDefs = self.language.findCharacters(text)
@@ -168,6 +200,10 @@ class MiniReader(QtGui.QPlainTextEdit): # QtGui.QMainWindow, gen.reader_ui.Ui_Ma
 
 
     def onKanjiDefSearchReturn(self):
+        if self.language is None:
+            self.pendingKanjiSearch = True
+            return
+
         text = unicode(self.textKanjiSearch.text())
         self.state.kanjiDefs = self.language.findCharacters(text)
         self.updateKanjiDefs()
@@ -195,6 +231,49 @@ class MiniReader(QtGui.QPlainTextEdit): # QtGui.QMainWindow, gen.reader_ui.Ui_Ma
         self.updateSampleMouseEvent(event)
 
 
+    def onTextChanged(self):
+        self.content = None
+        self.lastLookup = None
+        self.setSpans(None)
+
+
+    def setSpans(self, spans):
+        # word spans of the current transcript line, when the transcript has been tokenized
+        self.lookup.setSpans(spans)
+
+
+    @profiling.handler
+    def onLanguageReady(self, language):
+        self.language = language
+        self.lookup.language = language
+        profiling.mark('lookup engine ready')
+
+        if self.pendingLookup:
+            self.pendingLookup = False
+            self.updateSampleFromPosition()
+
+        if self.pendingVocabSearch:
+            self.pendingVocabSearch = False
+            self.onVocabDefSearchReturn()
+
+        if self.pendingKanjiSearch:
+            self.pendingKanjiSearch = False
+            self.onKanjiDefSearchReturn()
+
+
+    @profiling.handler
+    def onLookupTimer(self):
+        if self.state.scanPosition != self.lastLookup:
+            self.updateSampleFromPosition()
+
+
+    def plainText(self):
+        if self.content is None:
+            self.content = unicode(self.toPlainText())
+            self.lookup.setContent(self.content)
+        return self.content
+
+
 
     def executeVocabCommand(self, command, index):
         if index >= len(self.state.vocabDefs):
@@ -215,15 +294,15 @@ class MiniReader(QtGui.QPlainTextEdit): # QtGui.QMainWindow, gen.reader_ui.Ui_Ma
             #else:
             #    result = u'{expression}\t{glossary}\n'.format(**definition)
 
-            if definition['reading']:
-                result = u'{expression} [{reading}] {glossary}\n'.format(**definition)
+            if definition.reading:
+                result = u'{0.expression} [{0.reading}] {0.glossary}\n'.format(definition)
             else:
-                result = u'{expression} {glossary}\n'.format(**definition)
+                result = u'{0.expression} {0.glossary}\n'.format(definition)
 
             self.LineDefs.Result = result
-            expression = u'{expression}'.format(**definition)
-            reading =  u'{reading}'.format(**definition)
-            glossary =  u'{glossary}'.format(**definition)
+            expression = u'{0.expression}'.format(definition)
+            reading =  u'{0.reading}'.format(definition)
+            glossary =  u'{0.glossary}'.format(definition)
             self.LineDefs.add(expression, reading, glossary)
 
 
@@ -245,63 +324,67 @@ class MiniReader(QtGui.QPlainTextEdit): # QtGui.QMainWindow, gen.reader_ui.Ui_Ma
         cursor = self.cursorForPosition(event.pos())
         self.state.scanPosition = cursor.position()
         if event.buttons() & QtCore.Qt.MidButton or event.modifiers() & QtCore.Qt.ShiftModifier:
-            self.updateSampleFromPosition()
+            if self.state.scanPosition == self.lastLookup:
+                self.lookupTimer.stop()
+                return
+
+            wait = self.lastLookupTime + self.lookupInterval / 1000.0 - timeit.default_timer()
+            if wait > 0:
+                if not self.lookupTimer.isActive():
+                    self.lookupTimer.start(int(wait * 1000) + 1)
+            else:
+                self.lookupTimer.stop()
+                self.updateSampleFromPosition()
 
 
+    @profiling.handler
     def updateSampleFromPosition(self):
-        samplePosStart = self.state.scanPosition
-        samplePosEnd = self.state.scanPosition + 20 #self.preferences['scanLength']
+        if self.language is None:
+            self.pendingLookup = True
+            return
 
-        cursor = self.textCursor()
-        content = unicode(self.toPlainText())
-        contentSample = content[samplePosStart:samplePosEnd]
-        contentSampleFlat = contentSample.replace(u'\n', unicode())
+        self.lastLookup = self.state.scanPosition
+        self.lastLookupTime = timeit.default_timer()
 
-        if len(contentSampleFlat) == 0 or not japanese.util.isJapanese(contentSampleFlat[0]):
-            cursor.clearSelection()
-            self.setTextCursor(cursor)
-            return
+        with instrument.stage('hover', root=True):
+            cursor = self.textCursor()
+            self.plainText()
 
-        lengthMatched = 0
-        if self.dockVocab.isVisible():
-            self.state.vocabDefs, lengthMatched = self.language.findTerm(contentSampleFlat)
-            sentence = reader_util.findSentence(content, samplePosStart)
-            for definition in self.state.vocabDefs:
-                definition['sentence'] = sentence
-            self.updateVocabDefs()
+            result = self.lookup.find(self.state.scanPosition, self.dockVocab.isVisible(), self.dockKanji.isVisible())
+            profiling.mark('first lookup')
+            if result is None:
+                cursor.clearSelection()
+                self.setTextCursor(cursor)
+                return
 
-        if self.dockKanji.isVisible():
-            if lengthMatched == 0:
-                self.state.kanjiDefs = self.language.findCharacters(contentSampleFlat[0])
-                if len(self.state.kanjiDefs) > 0:
-                    lengthMatched = 1
-            else:
-                self.state.kanjiDefs = self.language.findCharacters(contentSampleFlat[:lengthMatched])
-            self.updateKanjiDefs()
+            samplePosStart, lengthSelect, vocabDefs, kanjiDefs = result
+            if self.dockVocab.isVisible():
+                self.state.vocabDefs = vocabDefs
+                self.updateVocabDefs()
 
-        lengthSelect = 0
-        for c in contentSample:
-            if lengthMatched <= 0:
-                break
-            lengthSelect += 1
-            if c != u'\n':
-                lengthMatched -= 1
+            if self.dockKanji.isVisible():
+                self.state.kanjiDefs = kanjiDefs
+                self.updateKanjiDefs()
 
-        cursor.setPosition(samplePosStart, QtGui.QTextCursor.MoveAnchor)
-        cursor.setPosition(samplePosStart + lengthSelect, QtGui.QTextCursor.KeepAnchor)
-        self.setTextCursor(cursor)
+            cursor.setPosition(samplePosStart, QtGui.QTextCursor.MoveAnchor)
+            cursor.setPosition(samplePosStart + lengthSelect, QtGui.QTextCursor.KeepAnchor)
+            self.setTextCursor(cursor)
 
     def updateVocabDefs(self):
-        html = self.dockVocab.buildVocabDefs(
-            self.state.vocabDefs[:20], #:self.preferences['maxResults']
-            None #self.ankiIsFactValid
-        )
-        self.textVocabDefs.setHtml(html)
+        with instrument.stage('html'):
+            html = self.dockVocab.buildVocabDefs(
+                self.state.vocabDefs[:constants.c['maxResults']],
+                None #self.ankiIsFactValid
+            )
+        with instrument.stage('setHtml'):
+            self.textVocabDefs.setHtml(html)
 
 
     def updateKanjiDefs(self):
-        html = self.dockVocab.buildKanjiDefs(
-            self.state.kanjiDefs[:20], #self.state.kanjiDefs[:self.preferences['maxRsults']],
-            None #self.ankiIsFactValid
-        )
-        self.textKanjiDefs.setHtml(html)
+        with instrument.stage('html'):
+            html = self.dockVocab.buildKanjiDefs(
+                self.state.kanjiDefs[:constants.c['maxResults']],
+                None #self.ankiIsFactValid
+            )
+        with instrument.stage('setHtml'):
+            self.textKanjiDefs.setHtml(html)
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2015  Christian Lott
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from PySide import QtGui
+import constants
+import functools
+import os
+import startup
+import sys
+import timeit
+
+
+# Opt-in slow handler detection: TP_PROFILE=1 or --profile. Decorated slots and
+# every event delivered by the application are timed, and anything over the threshold
+# (TP_PROFILE_THRESHOLD or --profile-threshold=ms) is logged to stderr.
+# TP_PROFILE_OUT or --profile-out=file also records a cProfile of the session.
+# Startup milestones (first window, lookup engine ready, first lookup) are logged too.
+
+enabled = os.environ.get('TP_PROFILE', '') not in ('', '0') or '--profile' in sys.argv
+threshold = float(startup.argument('--profile-threshold') or os.environ.get('TP_PROFILE_THRESHOLD') or constants.c['slowHandler'])
+output = startup.argument('--profile-out') or os.environ.get('TP_PROFILE_OUT')
+if output:
+    enabled = True
+
+depth = 0
+profiler = None
+started = timeit.default_timer()
+marks = set()
+
+
+def report(elapsed, name, *args):
+    # the name is only formatted with args when it is logged
+    ms = elapsed * 1000.0
+    if ms >= threshold:
+        sys.stderr.write('slow handler: {0}{1} {2:.1f} ms\n'.format('  ' * depth, name.format(*args).rstrip(), ms))
+
+
+def mark(name):
+    # a startup milestone, logged the first time it is reached with the time since
+    # this module was imported; also recorded by the startup trace
+    startup.mark(name)
+    if enabled and name not in marks:
+        marks.add(name)
+        sys.stderr.write('startup: {0} at {1:.0f} ms\n'.format(name, (timeit.default_timer() - started) * 1000.0))
+
+
+def handler(func):
+    # a method used as a slot or event handler; unchanged unless profiling
+    if not enabled:
+        return func
+
+    # PySide passes a slot as many signal arguments as it accepts, which is all of
+    # them for *args, so trim back to what the method takes
+    code = func.func_code
+    count = None if code.co_flags & 0x04 else code.co_argcount
+
+    @functools.wraps(func)
+    def wrapper(*args):
+        global depth
+        if count is not None:
+            args = args[:count]
+
+        depth += 1
+        start = timeit.default_timer()
+        try:
+            return func(*args)
+        finally:
+            depth -= 1
+            report(timeit.default_timer() - start, '{0}.{1}', args[0].__class__.__name__, func.__name__)
+
+    return wrapper
+
+
+class ProfilingApplication(QtGui.QApplication):
+    # times every event delivery, which covers event handlers and queued slots
+    def notify(self, receiver, event):
+        global depth
+        depth += 1
+        start = timeit.default_timer()
+        try:
+            return super(ProfilingApplication, self).notify(receiver, event)
+        finally:
+            depth -= 1
+            report(timeit.default_timer() - start, 'event {0} -> {1} {2}', event.type(), receiver.__class__.__name__, receiver.objectName())
+
+
+def createApplication(argv):
+    if not enabled:
+        return QtGui.QApplication(argv)
+
+    app = ProfilingApplication(argv)
+    if output:
+        start()
+        app.aboutToQuit.connect(stop)
+
+    sys.stderr.write('profiling: logging handlers over {0:.0f} ms{1}\n'.format(threshold, ', cProfile to ' + output if output else ''))
+    return app
+
+
+def start():
+    import cProfile
+
+    global profiler
+    profiler = cProfile.Profile()
+    profiler.enable()
+
+
+def stop():
+    global profiler
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(output)
+        sys.stderr.write('profiling: session profile written to {0}\n'.format(output))
+        profiler = None
@@ -16,9 +16,17 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
-from PySide import QtGui
+from core.rendering import markupVocabExp, markupVocabReading, markupKanji, buildVocabDef, buildKanjiDef
+from core.sentence import SentenceIndex
+from core import rendering
 import re
 
+# QtGui is imported where the clipboard or palette is used, so the text helpers
+# here load without Qt
+
+
+sentenceIndex = None
+
 
 def decodeContent(content):
     encodings = ['utf-8', 'shift_jis', 'euc-jp', 'utf-16']
@@ -39,45 +47,13 @@ def stripReadings(content):
 
 
 def findSentence(content, position):
-    quotesFwd = {u'「': u'」', u'『': u'』', u"'": u"'", u'"': u'"'}
-    quotesBwd = {u'」': u'「', u'』': u'『', u"'": u"'", u'"': u'"'}
-    terminators = u'。．.？?！!'
-
-    quoteStack = list()
-
-    start = 0
-    for i in xrange(position, start, -1):
-        c = content[i]
-
-        if not quoteStack and (c in terminators or c in quotesFwd or c == '\n'):
-            start = i + 1
-            break
-
-        if quoteStack and c == quoteStack[0]:
-            quoteStack.pop()
-        elif c in quotesBwd:
-            quoteStack.insert(0, quotesBwd[c])
-
-    quoteStack = list()
-
-    end = len(content)
-    for i in xrange(position, end):
-        c = content[i]
-
-        if not quoteStack:
-            if c in terminators:
-                end = i + 1
-                break
-            elif c in quotesBwd:
-                end = i
-                break
+    # the boundary index of the last text is kept, so repeated lookups in the same
+    # text only bisect
+    global sentenceIndex
+    if sentenceIndex is None or sentenceIndex.content is not content:
+        sentenceIndex = SentenceIndex(content)
 
-        if quoteStack and c == quoteStack[0]:
-            quoteStack.pop()
-        elif c in quotesFwd:
-            quoteStack.insert(0, quotesFwd[c])
-
-    return content[start:end].strip()
+    return sentenceIndex.find(position)
 
 
 def formatFields(fields, markup):
@@ -95,56 +71,34 @@ def splitTags(tags):
     return filter(lambda tag: tag.strip(), re.split('[;,\s]', tags))
 
 
-def markupVocabExp(definition):
-    if definition['reading']:
-        summary = u'{expression} [{reading}]'.format(**definition)
-    else:
-        summary = u'{expression}'.format(**definition)
-
-    return {
-        'expression': definition['expression'],
-        'reading': definition['reading'] or unicode(),
-        'glossary': definition['glossary'],
-        'sentence': definition.get('sentence'),
-        'summary': summary
-    }
+def copyVocabDef(definition):
+    from PySide import QtGui
 
+    if definition.reading:
+        result = u'{0.expression}\t{0.reading}\t{0.glossary}\n'.format(definition)
+    else:
+        result = u'{0.expression}\t{0.glossary}\n'.format(definition)
 
-def markupVocabReading(definition):
-    if definition['reading']:
-        return {
-            'expression': definition['reading'],
-            'reading': unicode(),
-            'glossary': definition['glossary'],
-            'sentence': definition.get('sentence'),
-            'summary': definition['reading']
-        }
+    QtGui.QApplication.clipboard().setText(result)
 
 
-def copyVocabDef(definition):
-    if definition['reading']:
-        result = u'{expression}\t{reading}\t{glossary}\n'.format(**definition)
-    else:
-        result = u'{expression}\t{glossary}\n'.format(**definition)
+def copyKanjiDef(definition):
+    from PySide import QtGui
 
-    QtGui.QApplication.clipboard().setText(result)
+    return QtGui.QApplication.clipboard().setText(u'{character}\t{kunyomi}\t{onyomi}\t{glossary}'.format(**definition))
 
 
-def markupKanji(definition):
-    return {
-        'character': definition['character'],
-        'onyomi': definition['onyomi'],
-        'kunyomi': definition['kunyomi'],
-        'glossary': definition['glossary'],
-        'summary': definition['character']
-    }
+def buildDefFooter():
+    return rendering.FOOTER
 
 
-def copyKanjiDef(definition):
-    return QtGui.QApplication.clipboard().setText(u'{character}\t{kunyomi}\t{onyomi}\t{glossary}'.format(**definition))
+def buildEmpty():
+    return rendering.EMPTY
 
 
 def buildDefHeader():
+    from PySide import QtGui
+
     palette = QtGui.QApplication.palette()
     toolTipBg = palette.color(QtGui.QPalette.Window).name()
     toolTipFg = palette.color(QtGui.QPalette.WindowText).name()
@@ -165,79 +119,25 @@ def buildDefHeader():
             # </style></head><body>""".format(self.bg, self.efs, self.eft, self.efg, self.rfs, self.rft, self.rfg, self.gfs, self.gft, self.gfg) + html + "</body></html>"
 
 
-def buildDefFooter():
-    return '</body></html>'
-
-
-def buildEmpty():
-    return u"""
-        <p>No definitions to display.</p>
-        <p>Mouse over text with the <em>middle mouse button</em> or <em>shift key</em> pressed to search.</p>
-        <p>You can also also input terms in the search box below."""
-
-
-def buildVocabDef(definition, index, query):
-    reading = unicode()
-    if definition['reading']:
-        reading = u'<span class = "reading">[{0}]<br/></span>'.format(definition['reading'])
-
-    rules = unicode()
-    if len(definition['rules']) > 0:
-        rules = ' &lt; '.join(definition['rules'])
-        rules = '<span class = "rules">({0})<br/></span>'.format(rules)
-
-    links = '<a href = "copyVocabDef:{0}"><img src = "img/icon_add_expression.png" align = "right"/></a>'.format(index)
-    if query is not None:
-        if query('vocab', markupVocabExp(definition)):
-            links += '<a href = "addVocabExp:{0}"><img src = "://img/img/icon_add_expression.png" align = "right"/></a>'.format(index)
-        if query('vocab', markupVocabReading(definition)):
-            links += '<a href = "addVocabReading:{0}"><img src = "://img/img/icon_add_reading.png" align = "right"/></a>'.format(index)
-
-    html = u"""
-        <span class = "links">{0}</span>
-        <span class = "expression">{1}<br/></span>
-        {2}
-        <span class = "glossary">{3}<br/></span>
-        {4}
-        <br clear = "all"/>""".format(links, definition['expression'], reading, definition['glossary'], rules)
-    #print html
-    return html
-
-
 def buildVocabDefs(definitions, query):
-    html = buildDefHeader()
+    html = [buildDefHeader()]
     if len(definitions) > 0:
         for i, definition in enumerate(definitions):
-            html += buildVocabDef(definition, i, query)
+            html.append(buildVocabDef(definition, i, query))
     else:
-        html += buildEmpty()
-
-    return html + buildDefFooter()
+        html.append(buildEmpty())
 
-
-def buildKanjiDef(definition, index, query):
-    links = '<a href = "copyKanjiDef:{0}"><img src = "://img/img/icon_copy_definition.png" align = "right"/></a>'.format(index)
-    if query is not None and query('kanji', markupKanji(definition)):
-        links += '<a href = "addKanji:{0}"><img src = "://img/img/icon_add_expression.png" align = "right"/></a>'.format(index)
-
-    readings = ', '.join([definition['kunyomi'], definition['onyomi']])
-    html = u"""
-        <span class = "links">{0}</span>
-        <span class = "expression">{1}<br/></span>
-        <span class = "reading">[{2}]<br/></span>
-        <span class = "glossary">{3}<br/></span>
-        <br clear = "all"/>""".format(links, definition['character'], readings, definition['glossary'])
-
-    return html
+    html.append(buildDefFooter())
+    return u''.join(html)
 
 
 def buildKanjiDefs(definitions, query):
-    html = buildDefHeader()
-
+    html = [buildDefHeader()]
     if len(definitions) > 0:
         for i, definition in enumerate(definitions):
-            html += buildKanjiDef(definition, i, query)
+            html.append(buildKanjiDef(definition, i, query))
     else:
-        html += buildEmpty()
+        html.append(buildEmpty())
 
-    return html + buildDefFooter()
+    html.append(buildDefFooter())
+    return u''.join(html)
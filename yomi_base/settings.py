@@ -18,7 +18,7 @@
 
 
 from PySide import QtGui, QtCore
-import pickle, os
+import pickle, os, timeit
 
 class cSettings(QtGui.QWidget):
     def __init__(self, session): # parent, preferences):
@@ -54,10 +54,35 @@ class cSettings(QtGui.QWidget):
         self.lineht = list()
         self.bgcolor_set = "white"
         self.bg_set = False
+        self.timings = dict() # last 'apply', 'reload' and 'switch' time in ms
 
         self.setupUI()
 
+    def beginUpdate(self):
+        # panels only record new values until endUpdate, then re-render once
+        self.vocabdock.beginUpdate()
+        self.linedefs.beginUpdate()
+
+    def endUpdate(self):
+        self.vocabdock.endUpdate()
+        self.linedefs.endUpdate()
+
+    def timed(self, name, func):
+        start = timeit.default_timer()
+        self.beginUpdate()
+        try:
+            func()
+        finally:
+            self.endUpdate()
+
+        self.timings[name] = (timeit.default_timer() - start) * 1000
+        if self.statusbar:
+            self.statusbar.showMessage("Theme {0} took {1:.1f} ms".format(name, self.timings[name]), 3000)
+
     def settheme(self):
+        self.timed('switch', self.switchtheme)
+
+    def switchtheme(self):
         print "#### set theme from: ####"
         print self.ThemeDir
         print self.ThemeFile
@@ -125,6 +150,9 @@ class cSettings(QtGui.QWidget):
             self.statusbar.showMessage("New Theme File Created: " + self.ThemeFile)
 
     def loadtheme(self):
+        self.timed('reload', self.reloadtheme)
+
+    def reloadtheme(self):
         print "load theme"
         # if self.ThemeDir == "":
         #     self.ThemeDir = QtCore.QDir.currentPath() + "/theme/"
@@ -166,6 +194,9 @@ class cSettings(QtGui.QWidget):
             return None
 
     def setall(self):
+        self.timed('apply', self.applyall)
+
+    def applyall(self):
         print "SET ALL "
         i = self.comboPanel.currentIndex()
         ft = self.fonttype[i]
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2015  Christian Lott
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import __builtin__
+import os
+import sys
+import thread
+import timeit
+
+
+# Opt-in startup trace: TP_STARTUP=1 or --startup-trace. Imported before Qt, it times
+# every module the main thread imports after it and each construction phase of the
+# main window, and writes a report once the window is shown to TP_STARTUP_OUT or
+# --startup-trace=file (stderr by default). Milestones reached later are appended.
+
+def argument(name):
+    # the value of --name=value on the command line; profiling.py uses it too
+    for arg in sys.argv:
+        if arg.startswith(name + '='):
+            return arg[len(name) + 1:]
+
+
+output = argument('--startup-trace') or os.environ.get('TP_STARTUP_OUT')
+enabled = os.environ.get('TP_STARTUP', '') not in ('', '0') or '--startup-trace' in sys.argv or output is not None
+
+started = timeit.default_timer()
+mainThread = thread.get_ident()
+builtinImport = __builtin__.__import__
+
+imports = list() # (module, depth, ms including nested imports, ms of its own) as each finishes
+phases = list() # (name, ms since start, ms)
+milestones = list() # (name, ms since start)
+children = [0.0] # per import being timed, ms spent in the imports nested in it
+reported = False
+
+
+def since():
+    return (timeit.default_timer() - started) * 1000.0
+
+
+#
+# Imports
+#
+
+def timedImport(name, *args, **kwargs):
+    if thread.get_ident() != mainThread:
+        return builtinImport(name, *args, **kwargs)
+
+    count = len(sys.modules)
+    children.append(0.0)
+    start = timeit.default_timer()
+    try:
+        return builtinImport(name, *args, **kwargs)
+    finally:
+        elapsed = (timeit.default_timer() - start) * 1000.0
+        nested = children.pop()
+        children[-1] += elapsed
+        if len(sys.modules) > count: # only imports that loaded something
+            imports.append((moduleName(name, args[0] if args else kwargs.get('globals')), len(children) - 1, elapsed, elapsed - nested))
+
+
+def moduleName(name, globals):
+    # implicit relative imports are named after the package they were made from
+    if globals and globals.get('__name__'):
+        module = globals['__name__']
+        package = module if '__path__' in globals else module.rpartition('.')[0]
+        if package and sys.modules.get(package + '.' + name) is not None:
+            return package + '.' + name
+
+    return name
+
+
+if enabled:
+    __builtin__.__import__ = timedImport
+
+
+#
+# Phases
+#
+
+class Phase:
+    def __init__(self, name):
+        self.name = name
+
+
+    def __enter__(self):
+        self.start = since()
+        return self
+
+
+    def __exit__(self, *exc):
+        phases.append((self.name, self.start, since() - self.start))
+
+
+class NullPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+nullPhase = NullPhase()
+
+
+def phase(name):
+    if not enabled:
+        return nullPhase
+    return Phase(name)
+
+
+def mark(name):
+    # a milestone, recorded the first time it is reached
+    if not enabled or name in [milestone[0] for milestone in milestones]:
+        return
+
+    milestones.append((name, since()))
+    if reported:
+        write(['  {0:<28} {1:8.1f} ms'.format(name, milestones[-1][1])])
+
+
+#
+# Report
+#
+
+def write(lines, mode='a'):
+    text = u''.join(line + '\n' for line in lines)
+    if output:
+        with open(output, mode) as fp:
+            fp.write(text.encode('utf-8'))
+    else:
+        sys.stderr.write(text)
+
+
+def report(top=15):
+    # stops timing imports and writes everything recorded so far
+    global reported
+    if not enabled or reported:
+        return
+
+    __builtin__.__import__ = builtinImport
+    reported = True
+
+    lines = ['startup trace, {0:.1f} ms since the trace was imported'.format(since())]
+    lines.append('phases:')
+    for name, start, ms in phases:
+        lines.append('  {0:<28} {1:8.1f} ms at {2:8.1f} ms'.format(name, ms, start))
+
+    lines.append('top-level imports ({0:.1f} ms, {1} modules loaded in all):'.format(sum(i[2] for i in imports if i[1] == 0), len(imports)))
+    for name, depth, ms, own in imports:
+        if depth == 0:
+            lines.append('  {0:<28} {1:8.1f} ms'.format(name, ms))
+
+    lines.append('slowest modules, excluding their own imports:')
+    for name, depth, ms, own in sorted(imports, key=lambda i: -i[3])[:top]:
+        lines.append('  {0:<28} {1:8.1f} ms'.format(name, own))
+
+    lines.append('milestones:')
+    for name, ms in milestones:
+        lines.append('  {0:<28} {1:8.1f} ms'.format(name, ms))
+
+    write(lines, 'w')
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2015  Christian Lott
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from PySide import QtCore
+import japanese
+
+
+class TranscriptTokenizer(QtCore.QThread):
+    # Splits every transcript line into (start, length, entry id) word spans,
+    # using its own dictionary connection off the GUI thread.
+    tokenized = QtCore.Signal(object, object)
+
+    def __init__(self, lines):
+        super(TranscriptTokenizer, self).__init__()
+        self.lines = lines
+        self.cancelled = False
+
+    def run(self):
+        language = japanese.initLanguage()
+
+        spans = list()
+        for line in self.lines:
+            if self.cancelled:
+                return
+            spans.append(language.segment(line))
+
+        self.tokenized.emit(self.lines, spans)